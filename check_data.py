@@ -1,3 +1,23 @@
-import pandas as pd
-df = pd.read_pickle('data/processed/features.pkl')
-print(df['image_id'].tolist())
\ No newline at end of file
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from feature_store import FeatureStore, FEATURE_STORE_PATH
+
+LEGACY_FEATURES_PATH = 'data/processed/features.pkl'
+
+if os.path.exists(os.path.join(FEATURE_STORE_PATH, 'meta.json')):
+    store = FeatureStore(FEATURE_STORE_PATH)
+elif os.path.exists(LEGACY_FEATURES_PATH):
+    # One-off conversion of the old pickled DataFrame
+    import pandas as pd
+    print(f"Converting {LEGACY_FEATURES_PATH} to a feature store at {FEATURE_STORE_PATH}")
+    store = FeatureStore.from_dataframe(pd.read_pickle(LEGACY_FEATURES_PATH), FEATURE_STORE_PATH)
+else:
+    # Opening a FeatureStore would create an empty one; there is nothing to inspect
+    print(f"No feature store at {FEATURE_STORE_PATH} and no {LEGACY_FEATURES_PATH}")
+    sys.exit(1)
+
+print(store.image_ids)
@@ -1,16 +1,16 @@
 import os
+import io
 import sys
+import hashlib
 import streamlit as st
-import torch
-import torch.nn as nn
 import numpy as np
-import pandas as pd
-from PIL import Image, ImageOps
 from pathlib import Path
-import plotly.graph_objects as go
-import plotly.express as px
-import subprocess
-import cv2
+
+from image_analysis import AnalysisContext
+from palette import extract_palette
+
+# torch/timm (via laion_aesthetic_predictor), plotly, cv2 and subprocess are
+# imported where they are first used, so the first paint does not wait on them
 
 # Fix for PyTorch compatibility issues with Streamlit
 import warnings
@@ -21,8 +21,6 @@ os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'
 project_root = str(Path(__file__).parent.parent)
 sys.path.append(project_root)
 
-from laion_aesthetic_predictor import LAIONAestheticPredictor
-
 # Set page config
 st.set_page_config(
     page_title="🎨 AI Aesthetic Scorer",
@@ -139,26 +137,18 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Define MLP model architecture
-class MLP(nn.Module):
-    def __init__(self, input_size):
-        super().__init__()
-        self.layers = nn.Sequential(
-            nn.Linear(input_size, 256),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(256, 128),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(128, 1)
-        )
-    
-    def forward(self, x):
-        return self.layers(x)
-
 @st.cache_resource
 def load_model():
-    return LAIONAestheticPredictor()
+    from laion_aesthetic_predictor import LAIONAestheticPredictor
+    from embedding_cache import EmbeddingCache
+
+    predictor = LAIONAestheticPredictor(
+        cache=EmbeddingCache(max_items=1024),
+        precision=os.environ.get("AESTHETIC_PRECISION", "fp32"),
+    )
+    # All sessions share this predictor; batch their requests instead of racing for torch threads
+    predictor.enable_micro_batching(max_batch_size=8, max_wait_ms=10)
+    return predictor
 
 def get_score_color(score):
     """Get color based on score"""
@@ -171,6 +161,8 @@ def get_score_color(score):
 
 def create_score_gauge(score):
     """Create a beautiful gauge chart for the score"""
+    import plotly.graph_objects as go
+
     fig = go.Figure(go.Indicator(
         mode = "gauge+number",
         value = score,
@@ -207,53 +199,21 @@ def create_score_gauge(score):
 
 # --- New Statistics Functions ---
 
-def calculate_sharpness(image_array):
+def calculate_sharpness(context):
     """Calculate image sharpness using the variance of the Laplacian."""
-    gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-    laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-    return laplacian_var
+    return context.stats["laplacian_var"]
 
-def extract_color_palette(image, num_colors=5):
-    """Extract the dominant color palette from an image using histogram method."""
-    # Resize for faster processing
-    img = image.copy()
-    img.thumbnail((100, 100))
-    
-    # Convert to numpy array
-    pixels = np.array(img)
-    
-    # Calculate histograms for each channel
-    hist_r = np.histogram(pixels[:, :, 0], bins=8, range=(0, 256))[0]
-    hist_g = np.histogram(pixels[:, :, 1], bins=8, range=(0, 256))[0]
-    hist_b = np.histogram(pixels[:, :, 2], bins=8, range=(0, 256))[0]
-    
-    # Find the most common color ranges
-    colors = []
-    for i in range(num_colors):
-        # Find the bin with the highest count for each channel
-        r_bin = np.argmax(hist_r)
-        g_bin = np.argmax(hist_g)
-        b_bin = np.argmax(hist_b)
-        
-        # Convert bin to color value (center of the bin)
-        r_val = int((r_bin + 0.5) * 256 / 8)
-        g_val = int((g_bin + 0.5) * 256 / 8)
-        b_val = int((b_bin + 0.5) * 256 / 8)
-        
-        colors.append([r_val, g_val, b_val])
-        
-        # Reduce the count for this bin to find the next most common color
-        hist_r[r_bin] = 0
-        hist_g[g_bin] = 0
-        hist_b[b_bin] = 0
-    
-    return np.array(colors)
-def create_brightness_histogram(image_array):
+def extract_color_palette(context, num_colors=5):
+    """Extract the dominant colors and their pixel percentages from the upload's thumbnail."""
+    return extract_palette(context.thumbnail, num_colors)
+
+def create_brightness_histogram(context):
     """Create a brightness histogram for the image."""
-    gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-    hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+    import plotly.graph_objects as go
+
+    hist = context.stats["luminance_hist"]
     
-    fig = go.Figure(data=[go.Bar(x=np.arange(256), y=hist.ravel())])
+    fig = go.Figure(data=[go.Bar(x=np.arange(256), y=hist)])
     fig.update_layout(
         title_text='Brightness Distribution',
         xaxis_title='Pixel Intensity (0=Black, 255=White)',
@@ -265,6 +225,32 @@ def create_brightness_histogram(image_array):
     )
     return fig
 
+# Analyses kept per server; each holds a JPEG preview plus small arrays and figures
+ANALYSIS_CACHE_ENTRIES = 32
+
+@st.cache_data(max_entries=ANALYSIS_CACHE_ENTRIES, show_spinner=False)
+def analyze_upload(content_hash, head_version, _data):
+    """Score and analyze one upload. Cached per server by content hash and head version,
+    so the reruns Streamlit does on every widget interaction never decode or score the
+    image again, while a new fine-tuned head still gets fresh scores."""
+    context = AnalysisContext.from_upload(io.BytesIO(_data))
+    score = load_model().predict(context.image)
+    palette, percentages = extract_color_palette(context)
+
+    preview = io.BytesIO()
+    context.image.save(preview, format="JPEG", quality=90)
+    # cache_data unpickles the result on every rerun; figures are kept as plain
+    # dicts because Figure objects re-validate on unpickling and take ~20 ms
+    return {
+        "score": score,
+        "preview": preview.getvalue(),
+        "palette": palette,
+        "percentages": percentages,
+        "sharpness": calculate_sharpness(context),
+        "gauge_fig": create_score_gauge(score).to_dict(),
+        "brightness_fig": create_brightness_histogram(context).to_dict(),
+    }
+
 def main():
     # Header
     st.markdown("""
@@ -274,8 +260,8 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    # Load the model
-    model = load_model()
+    # Load the model, picking up a head fine-tuned since the last rerun (a stat() when unchanged)
+    load_model().reload_head()
     
     # Sidebar
     with st.sidebar:
@@ -315,26 +301,33 @@ def main():
         """)
         
         if st.button("🚀 Start Fine-Tuning"):
-            st.info("Fine-tuning started... This may take a few minutes. Please see the terminal for progress.")
+            st.info("Fine-tuning started... Embedding new photos takes a moment; training the head takes seconds.")
             
             # Run the fine-tuning script
+            import subprocess
             try:
                 process = subprocess.Popen(
-                    [sys.executable, "src/finetune_model.py"],
+                    [sys.executable, "-u", "src/finetune_model.py"],
                     stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    bufsize=1,
                 )
                 
-                # Display output in a dedicated expander
+                # Stream the output into a dedicated expander as it is printed
                 with st.expander("Show Fine-Tuning Logs", expanded=True):
-                    stdout, stderr = process.communicate()
+                    log_area = st.empty()
+                    lines = []
+                    for line in process.stdout:
+                        lines.append(line.rstrip())
+                        log_area.code("\n".join(lines[-200:]), language='text')
+                    process.wait()
                     if process.returncode == 0:
-                        st.code(stdout, language='text')
                         st.success("Fine-tuning complete! The app will now use your personalized model.")
+                        # Swap the new head into the shared predictor; the backbone stays loaded
+                        load_model().reload_head()
                         st.balloons()
                     else:
-                        st.code(stderr, language='text')
                         st.error("Fine-tuning failed. Please check the logs above for errors.")
                         
             except Exception as e:
@@ -353,17 +346,16 @@ def main():
         )
 
         if uploaded_file is not None:
-            image = Image.open(uploaded_file).convert("RGB")
-            
-            # Auto-orient the image using ImageOps
-            image = ImageOps.exif_transpose(image)
-            
-            # Show image with proper aspect ratio
-            st.image(image, use_container_width=True, caption="Analyzed Image")
-            
-            # Analyze image
+            data = uploaded_file.getvalue()
+            content_hash = hashlib.sha256(data).hexdigest()
+
+            # Decode, orient, score and analyze once per distinct upload
             with st.spinner("🎨 Analyzing aesthetic quality..."):
-                score = model.predict(image)
+                analysis = analyze_upload(content_hash, load_model().head_version, data)
+            score = analysis["score"]
+
+            # Show image with proper aspect ratio
+            st.image(analysis["preview"], use_container_width=True, caption="Analyzed Image")
             
             st.markdown("---")
             st.subheader("📊 Aesthetic Analysis Results")
@@ -377,8 +369,7 @@ def main():
             """, unsafe_allow_html=True)
             
             # Gauge chart
-            gauge_fig = create_score_gauge(score)
-            st.plotly_chart(gauge_fig, use_container_width=True)
+            st.plotly_chart(analysis["gauge_fig"], use_container_width=True)
             
             # Score interpretation
             if score >= 8:
@@ -394,27 +385,25 @@ def main():
             st.subheader("🔬 Image Statistics")
 
             # --- Display New Statistics ---
-            image_array = np.array(image)
             tab1, tab2, tab3 = st.tabs(["🎨 Color Palette", "💡 Brightness", "🔪 Sharpness"])
 
             with tab1:
                 st.write("Dominant Colors in Your Image:")
-                palette = extract_color_palette(image)
+                palette, percentages = analysis["palette"], analysis["percentages"]
                 cols = st.columns(len(palette))
-                for i, color in enumerate(palette):
+                for i, (color, percentage) in enumerate(zip(palette, percentages)):
                     hex_color = f'#{color[0]:02x}{color[1]:02x}{color[2]:02x}'
                     with cols[i]:
-                        st.color_picker(label=f'Color {i+1}', value=hex_color, key=f'color_picker_{i}')
+                        st.color_picker(label=f'Color {i+1} ({percentage:.0f}%)', value=hex_color, key=f'color_picker_{i}')
 
             with tab2:
                 st.write("Brightness & Contrast Analysis:")
-                brightness_fig = create_brightness_histogram(image_array)
-                st.plotly_chart(brightness_fig, use_container_width=True)
+                st.plotly_chart(analysis["brightness_fig"], use_container_width=True)
                 st.info("A well-exposed photo typically has a histogram with a good spread of tones across the range, without being bunched up at the edges.")
 
             with tab3:
                 st.write("Sharpness & Focus Analysis:")
-                sharpness = calculate_sharpness(image_array)
+                sharpness = analysis["sharpness"]
                 st.metric(label="Sharpness Score (Laplacian Variance)", value=f"{sharpness:.2f}")
                 
                 if sharpness < 50:
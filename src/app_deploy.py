@@ -1,13 +1,13 @@
 import os
 import sys
+import importlib.util
 import streamlit as st
 import numpy as np
-import pandas as pd
-from PIL import Image, ImageOps
+from PIL import Image
 from pathlib import Path
-import plotly.graph_objects as go
-import plotly.express as px
-import cv2
+
+# torch/timm (via laion_aesthetic_predictor), plotly and cv2 are imported where
+# they are first used, so the first paint does not wait on them
 
 # Fix for PyTorch compatibility issues with Streamlit
 import warnings
@@ -18,22 +18,19 @@ os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '1'
 project_root = str(Path(__file__).parent.parent)
 sys.path.append(project_root)
 
-# Try to import PyTorch with error handling
-try:
-    import torch
-    import torch.nn as nn
-    TORCH_AVAILABLE = True
-except ImportError:
+from image_stats import compute_image_stats
+from palette import extract_palette
+
+# Check that PyTorch is installed without paying for the import
+TORCH_AVAILABLE = importlib.util.find_spec("torch") is not None
+if not TORCH_AVAILABLE:
     st.error("PyTorch not available. Please check your installation.")
-    TORCH_AVAILABLE = False
 
-# Try to import the aesthetic predictor
-try:
-    from laion_aesthetic_predictor import LAIONAestheticPredictor
-    PREDICTOR_AVAILABLE = True
-except ImportError as e:
-    st.error(f"Could not import aesthetic predictor: {e}")
-    PREDICTOR_AVAILABLE = False
+# Check the aesthetic predictor's dependencies; it is imported in load_model()
+missing = [name for name in ("timm", "torchvision") if importlib.util.find_spec(name) is None]
+PREDICTOR_AVAILABLE = not missing
+if missing:
+    st.error(f"Could not import aesthetic predictor: missing {', '.join(missing)}")
 
 # Set page config
 st.set_page_config(
@@ -136,7 +133,15 @@ def load_model():
         return None
     
     try:
-        predictor = LAIONAestheticPredictor()
+        from laion_aesthetic_predictor import LAIONAestheticPredictor
+        from embedding_cache import EmbeddingCache
+
+        predictor = LAIONAestheticPredictor(
+            cache=EmbeddingCache(max_items=1024),
+            precision=os.environ.get("AESTHETIC_PRECISION", "fp32"),
+        )
+        # All sessions share this predictor; batch their requests instead of racing for torch threads
+        predictor.enable_micro_batching(max_batch_size=8, max_wait_ms=10)
         return predictor
     except Exception as e:
         st.error(f"Error loading model: {e}")
@@ -153,6 +158,8 @@ def get_score_color(score):
 
 def create_score_gauge(score):
     """Create a gauge chart for the aesthetic score"""
+    import plotly.graph_objects as go
+
     fig = go.Figure(go.Indicator(
         mode = "gauge+number+delta",
         value = score,
@@ -183,44 +190,23 @@ def create_score_gauge(score):
     
     return fig
 
-def calculate_sharpness(image_array):
-    """Calculate image sharpness using Laplacian variance"""
-    gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-    laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-    return laplacian_var
+def calculate_image_stats(image_array):
+    """Brightness, Laplacian-variance sharpness and the luminance histogram in one pass"""
+    return compute_image_stats(image_array, sharpness=("laplacian",))
 
 def extract_color_palette(image, num_colors=5):
-    """Extract dominant colors from image"""
+    """Extract dominant colors and their pixel percentages from image"""
     # Resize image for faster processing
     image_small = image.resize((150, 150))
-    image_array = np.array(image_small)
-    
-    # Reshape to get all pixels
-    pixels = image_array.reshape(-1, 3)
-    
-    # Use k-means to find dominant colors
-    from sklearn.cluster import KMeans
-    kmeans = KMeans(n_clusters=num_colors, random_state=42)
-    kmeans.fit(pixels)
-    
-    # Get the colors and their percentages
-    colors = kmeans.cluster_centers_.astype(int)
-    labels = kmeans.labels_
-    
-    # Calculate percentages
-    unique, counts = np.unique(labels, return_counts=True)
-    percentages = (counts / len(labels)) * 100
-    
-    return colors, percentages
+    return extract_palette(np.asarray(image_small), num_colors)
 
-def create_brightness_histogram(image_array):
+def create_brightness_histogram(luminance_hist):
     """Create brightness histogram"""
-    gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-    hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
-    
+    import plotly.express as px
+
     fig = px.line(
         x=range(256), 
-        y=hist.flatten(),
+        y=luminance_hist,
         title="Brightness Distribution",
         labels={'x': 'Brightness', 'y': 'Frequency'}
     )
@@ -290,10 +276,11 @@ def main():
                 image = image.convert('RGB')
             
             # Get image array for analysis
-            image_array = np.array(image)
+            image_array = np.asarray(image)
             
             # Calculate basic metrics
-            sharpness = calculate_sharpness(image_array)
+            stats = calculate_image_stats(image_array)
+            sharpness = stats["laplacian_var"]
             
             # Display metrics
             st.metric("Sharpness", f"{sharpness:.2f}")
@@ -349,7 +336,7 @@ def main():
                 st.subheader("📊 Detailed Analysis")
                 
                 # Brightness histogram
-                brightness_fig = create_brightness_histogram(image_array)
+                brightness_fig = create_brightness_histogram(stats["luminance_hist"])
                 st.plotly_chart(brightness_fig, use_container_width=True)
                 
             except Exception as e:
@@ -11,6 +11,9 @@ import plotly.express as px
 project_root = str(Path(__file__).parent.parent)
 sys.path.append(project_root)
 
+from image_stats import compute_image_stats
+from palette import extract_palette
+
 # Set page config
 st.set_page_config(
     page_title="🎨 AI Aesthetic Scorer",
@@ -83,71 +86,24 @@ def create_score_gauge(score):
     return fig
 
 def extract_color_palette(image, num_colors=5):
-    """Extract dominant colors from image using basic methods"""
+    """Extract dominant colors and their pixel percentages (no sklearn dependency)"""
     # Resize image for faster processing
     image_small = image.resize((150, 150))
-    image_array = np.array(image_small)
-    
-    # Simple color extraction (no sklearn dependency)
-    pixels = image_array.reshape(-1, 3)
-    
-    # Use basic clustering approach
-    colors = []
-    percentages = []
-    
-    # Sample colors from different regions
-    h, w = image_array.shape[:2]
-    regions = [
-        (0, 0, w//2, h//2),      # Top-left
-        (w//2, 0, w, h//2),      # Top-right
-        (0, h//2, w//2, h),      # Bottom-left
-        (w//2, h//2, w, h),      # Bottom-right
-        (w//4, h//4, 3*w//4, 3*h//4)  # Center
-    ]
-    
-    for i, (x1, y1, x2, y2) in enumerate(regions):
-        region = image_array[y1:y2, x1:x2]
-        if region.size > 0:
-            avg_color = np.mean(region, axis=(0, 1)).astype(int)
-            colors.append(avg_color)
-            percentages.append(20.0)  # Equal distribution
-    
-    return colors, percentages
+    return extract_palette(np.asarray(image_small), num_colors)
 
 def calculate_basic_metrics(image_array):
-    """Calculate basic image metrics"""
-    # Convert to grayscale for calculations
-    if len(image_array.shape) == 3:
-        gray = np.mean(image_array, axis=2)
-    else:
-        gray = image_array
-    
-    # Brightness
-    brightness = np.mean(gray)
-    
-    # Contrast (standard deviation)
-    contrast = np.std(gray)
-    
-    # Sharpness (simplified)
-    # Use gradient magnitude as sharpness indicator
-    from scipy import ndimage
-    try:
-        grad_x = ndimage.sobel(gray, axis=1)
-        grad_y = ndimage.sobel(gray, axis=0)
-        sharpness = np.mean(np.sqrt(grad_x**2 + grad_y**2))
-    except:
-        sharpness = contrast  # Fallback
-    
+    """Calculate basic image metrics (luma mean, std and Sobel gradient sharpness) in one pass"""
+    stats = compute_image_stats(image_array, sharpness=("gradient",), histograms=False)
     return {
-        'brightness': brightness,
-        'contrast': contrast,
-        'sharpness': sharpness
+        'brightness': stats['brightness'],
+        'contrast': stats['contrast'],
+        'sharpness': stats['gradient_mean']
     }
 
-def predict_aesthetic_score(image):
+def predict_aesthetic_score(image, metrics=None):
     """Simple aesthetic score prediction based on image metrics"""
-    image_array = np.array(image)
-    metrics = calculate_basic_metrics(image_array)
+    if metrics is None:
+        metrics = calculate_basic_metrics(np.asarray(image))
     
     # Simple scoring algorithm
     brightness_score = min(metrics['brightness'] / 128.0, 2.0)  # Normalize brightness
@@ -201,7 +157,7 @@ def main():
                 image = image.convert('RGB')
             
             # Get image array for analysis
-            image_array = np.array(image)
+            image_array = np.asarray(image)
             
             # Calculate basic metrics
             metrics = calculate_basic_metrics(image_array)
@@ -225,7 +181,7 @@ def main():
         with st.spinner("Analyzing image..."):
             try:
                 # Get aesthetic score
-                score = predict_aesthetic_score(image)
+                score = predict_aesthetic_score(image, metrics)
                 
                 # Display results
                 st.markdown("---")
@@ -1,7 +1,15 @@
+import sys
+from pathlib import Path
 import streamlit as st
 import numpy as np
 from PIL import Image
 
+# Sibling modules (image_stats, palette, numpy_head) must import when this file is loaded
+# as src.app_... from streamlit_app.py, too
+sys.path.append(str(Path(__file__).parent))
+from image_stats import compute_image_stats
+from palette import extract_palette
+
 # Set page config
 st.set_page_config(
     page_title="🎨 AI Aesthetic Scorer",
@@ -41,35 +49,28 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def calculate_basic_metrics(image_array):
-    """Calculate basic image metrics"""
-    # Convert to grayscale for calculations
-    if len(image_array.shape) == 3:
-        gray = np.mean(image_array, axis=2)
-    else:
-        gray = image_array
-    
-    # Brightness
-    brightness = np.mean(gray)
-    
-    # Contrast (standard deviation)
-    contrast = np.std(gray)
-    
-    # Simple sharpness (variance of differences)
-    h, w = gray.shape
-    diff_x = np.diff(gray, axis=1)
-    diff_y = np.diff(gray, axis=0)
-    sharpness = np.std(diff_x) + np.std(diff_y)
-    
+    """Calculate basic image metrics (luma mean, std and neighbour-difference sharpness) in one pass"""
+    stats = compute_image_stats(image_array, sharpness=("diff",), histograms=False)
     return {
-        'brightness': brightness,
-        'contrast': contrast,
-        'sharpness': sharpness
+        'brightness': stats['brightness'],
+        'contrast': stats['contrast'],
+        'sharpness': stats['diff_std']
     }
 
-def predict_aesthetic_score(image):
-    """Simple aesthetic score prediction based on image metrics"""
-    image_array = np.array(image)
-    metrics = calculate_basic_metrics(image_array)
+@st.cache_resource
+def load_model_scorer():
+    """Real model scorer without torch (exported ONNX backbone + NumPy head), or None if not deployed"""
+    from numpy_head import load_torch_free_predictor
+    return load_torch_free_predictor()
+
+def predict_aesthetic_score(image, metrics=None):
+    """Aesthetic score from the model when deployed, otherwise a simple prediction based on image metrics"""
+    scorer = load_model_scorer()
+    if scorer is not None:
+        return scorer.predict(image)
+
+    if metrics is None:
+        metrics = calculate_basic_metrics(np.asarray(image))
     
     # Simple scoring algorithm
     brightness_score = min(metrics['brightness'] / 128.0, 2.0)  # Normalize brightness
@@ -86,30 +87,10 @@ def predict_aesthetic_score(image):
     return aesthetic_score
 
 def extract_dominant_colors(image, num_colors=5):
-    """Extract dominant colors using simple sampling"""
+    """Extract dominant colors and their pixel percentages from a color histogram"""
     # Resize image for faster processing
     image_small = image.resize((100, 100))
-    image_array = np.array(image_small)
-    
-    # Sample colors from different regions
-    h, w = image_array.shape[:2]
-    colors = []
-    
-    # Sample from corners and center
-    positions = [
-        (0, 0),           # Top-left
-        (w-1, 0),         # Top-right
-        (0, h-1),         # Bottom-left
-        (w-1, h-1),       # Bottom-right
-        (w//2, h//2)      # Center
-    ]
-    
-    for x, y in positions:
-        if 0 <= x < w and 0 <= y < h:
-            color = image_array[y, x]
-            colors.append(color)
-    
-    return colors, [20.0] * len(colors)  # Equal distribution
+    return extract_palette(np.asarray(image_small), num_colors)
 
 def main():
     # Header
@@ -149,7 +130,7 @@ def main():
                 image = image.convert('RGB')
             
             # Get image array for analysis
-            image_array = np.array(image)
+            image_array = np.asarray(image)
             
             # Calculate basic metrics
             metrics = calculate_basic_metrics(image_array)
@@ -173,7 +154,7 @@ def main():
         with st.spinner("Analyzing image..."):
             try:
                 # Get aesthetic score
-                score = predict_aesthetic_score(image)
+                score = predict_aesthetic_score(image, metrics)
                 
                 # Display results
                 st.markdown("---")
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Early-exit scoring: stop the ViT at the first block whose exit head is sure.
+
+Small heads read the CLS token after intermediate blocks and predict the full
+model's score together with its uncertainty (a standard deviation in score
+points). They are distilled from the full model, so any unlabeled photos will
+do for training, and their uncertainty is calibrated on a held-out split. At
+inference, images whose predicted standard deviation falls below the
+threshold leave the batch at that block; the rest run on, at most through all
+12 blocks and the regular head.
+
+    python src/early_exit.py train photos/ --output models/early_exit_heads.pth
+    python src/early_exit.py report photos/ --threshold 0.1 0.25 0.5
+"""
+
+import os
+import sys
+import copy
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from laion_aesthetic_predictor import MODEL_NAME, PRECISIONS
+from prefetch import PrefetchPipeline
+
+EXIT_HEADS_PATH = Path("models/early_exit_heads.pth")
+# 1-based block indices an exit head is trained for (the ViT has 12)
+EXIT_BLOCKS = (4, 6, 8, 10)
+# Predicted standard deviation, in score points, below which an image exits
+DEFAULT_THRESHOLD = 0.25
+
+
+class ExitHead(torch.nn.Module):
+    """CLS token after an intermediate block -> (score, log variance)."""
+
+    def __init__(self, dim=768, hidden=256):
+        super().__init__()
+        self.norm = torch.nn.LayerNorm(dim)
+        self.layers = torch.nn.Sequential(
+            torch.nn.Linear(dim, hidden),
+            torch.nn.GELU(),
+            torch.nn.Linear(hidden, 2),
+        )
+        # Calibration: multiplies the predicted standard deviation (set by train_exit_head)
+        self.register_buffer("scale", torch.ones(()))
+
+    def forward(self, cls):
+        out = self.layers(self.norm(cls.float()))
+        return out[:, 0], out[:, 1]
+
+    def predict(self, cls):
+        """(mean, calibrated standard deviation) per row."""
+        mean, log_var = self(cls)
+        return mean, torch.exp(0.5 * log_var) * self.scale
+
+
+def _tokens(model, pixels):
+    """Patch and position embeddings: the input of the first block (as in timm's forward_features)."""
+    x = model._pos_embed(model.patch_embed(pixels))
+    for name in ("patch_drop", "norm_pre"):  # Missing in older timm versions
+        layer = getattr(model, name, None)
+        if layer is not None:
+            x = layer(x)
+    return x
+
+
+def _pixel_batches(predictor, sources, batch_size=32, workers=None):
+    """Preprocessed batches as tensors over PrefetchPipeline's recycled buffers: use each before the next."""
+    pipeline = PrefetchPipeline(
+        predictor.fused_preprocess,
+        batch_size=batch_size,
+        workers=workers,
+        min_size=predictor.preprocess_config["draft_min_size"],
+    )
+    for batch in pipeline.batches(sources):
+        for index, error in batch.failures:
+            print(f"⚠️ Could not read input {index}: {error}")
+        if batch.indices:
+            yield torch.from_numpy(batch.pixels)
+
+
+def load_pixel_batches(predictor, sources, batch_size=32, workers=None):
+    """Decode and preprocess every source up front; returns a list of batches that own their memory."""
+    # PrefetchPipeline reuses a few buffers, so keeping its batches needs a copy of each
+    return [pixels.clone() for pixels in _pixel_batches(predictor, sources, batch_size, workers)]
+
+
+@torch.no_grad()
+def collect_exit_features(predictor, sources, exit_blocks=EXIT_BLOCKS, batch_size=32, workers=None):
+    """Run the full backbone once per image, keeping the CLS token after each exit block.
+
+    Returns ({block: (N, 768) float32}, (N,) full-model scores) for the
+    images that could be decoded.
+    """
+    model = predictor.model
+    features = {block: [] for block in exit_blocks}
+    targets = []
+    for pixels in _pixel_batches(predictor, sources, batch_size, workers):
+        with predictor._autocast():
+            x = _tokens(model, pixels.to(predictor.device))
+            for depth, block in enumerate(model.blocks, start=1):
+                x = block(x)
+                if depth in features:
+                    features[depth].append(x[:, 0].float().cpu().numpy())
+            cls = model.norm(x)[:, 0].float().cpu().numpy()
+        targets.append(predictor.score_embeddings(cls))
+    if not targets:
+        raise ValueError("No input image could be decoded")
+    return {block: np.concatenate(f) for block, f in features.items()}, np.concatenate(targets)
+
+
+def train_exit_head(features, targets, epochs=100, lr=1e-3, weight_decay=1e-4, batch_size=64,
+                    val_fraction=0.2, patience=15, seed=0):
+    """Fit an ExitHead by Gaussian negative log-likelihood and calibrate its uncertainty.
+
+    The weights with the lowest held-out loss are kept; `scale` is then set so
+    the held-out squared errors average one predicted variance. Returns
+    (head, held-out mean absolute error).
+    """
+    generator = torch.Generator().manual_seed(seed)
+    x = torch.from_numpy(features)
+    y = torch.from_numpy(np.asarray(targets, dtype=np.float32))
+    order = torch.randperm(len(x), generator=generator)
+    n_val = int(len(x) * val_fraction) if len(x) >= 10 else 0
+    # Without a held-out split, select and calibrate on the training data
+    val_idx, train_idx = (order[:n_val], order[n_val:]) if n_val else (order, order)
+
+    head = ExitHead(x.shape[1])
+    optimizer = torch.optim.AdamW(head.parameters(), lr=lr, weight_decay=weight_decay)
+    loss_fn = torch.nn.GaussianNLLLoss()
+    best_loss, best_state, best_epoch = float("inf"), copy.deepcopy(head.state_dict()), 0
+    for epoch in range(1, epochs + 1):
+        head.train()
+        for batch in train_idx[torch.randperm(len(train_idx), generator=generator)].split(batch_size):
+            optimizer.zero_grad()
+            mean, log_var = head(x[batch])
+            loss_fn(mean, y[batch], log_var.exp()).backward()
+            optimizer.step()
+        head.eval()
+        with torch.no_grad():
+            mean, log_var = head(x[val_idx])
+            val_loss = loss_fn(mean, y[val_idx], log_var.exp()).item()
+        if val_loss < best_loss:
+            best_loss, best_state, best_epoch = val_loss, copy.deepcopy(head.state_dict()), epoch
+        if epoch - best_epoch >= patience:
+            break
+
+    head.load_state_dict(best_state)
+    head.eval()
+    with torch.no_grad():
+        mean, log_var = head(x[val_idx])
+        errors = mean - y[val_idx]
+        head.scale.fill_(float(torch.sqrt((errors ** 2 / log_var.exp()).mean())))
+    return head, float(errors.abs().mean())
+
+
+def save_exit_heads(heads, path, **metadata):
+    """Write {block: ExitHead} to `path` atomically."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        torch.save({
+            "model": MODEL_NAME,
+            "heads": {block: head.state_dict() for block, head in heads.items()},
+            **metadata,
+        }, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_exit_heads(path=EXIT_HEADS_PATH, device="cpu"):
+    """{block: ExitHead} from a file written by save_exit_heads."""
+    checkpoint = torch.load(path, map_location=device)
+    if checkpoint.get("model") != MODEL_NAME:
+        raise ValueError(f"Exit heads in {path} are for {checkpoint.get('model')!r}, expected {MODEL_NAME!r}")
+    heads = {}
+    for block, state_dict in checkpoint["heads"].items():
+        head = ExitHead(state_dict["norm.weight"].shape[0])
+        head.load_state_dict(state_dict)
+        heads[int(block)] = head.to(device).eval()
+    return heads
+
+
+class EarlyExitScorer:
+    """Scores with a predictor's backbone, letting confident images leave the batch early.
+
+    After each block with an exit head, images whose calibrated standard
+    deviation is below `threshold` get that head's score and are dropped from
+    the batch, so later blocks only run on the rest. Images that never become
+    confident are scored by the predictor's own head as usual.
+    """
+
+    def __init__(self, predictor, heads, threshold=DEFAULT_THRESHOLD):
+        self.predictor = predictor
+        self.heads = heads
+        self.threshold = threshold
+
+    @classmethod
+    def from_file(cls, predictor, path=EXIT_HEADS_PATH, threshold=DEFAULT_THRESHOLD):
+        return cls(predictor, load_exit_heads(path, predictor.device), threshold)
+
+    @torch.no_grad()
+    def score_pixels(self, pixels):
+        """Score a preprocessed (N, 3, H, W) batch; returns (scores, blocks executed per image)."""
+        model = self.predictor.model
+        num_blocks = len(model.blocks)
+        scores = np.empty(len(pixels), dtype=np.float32)
+        blocks = np.full(len(pixels), num_blocks, dtype=np.int64)
+        active = np.arange(len(pixels))
+        with self.predictor._autocast():
+            x = _tokens(model, pixels.to(self.predictor.device))
+            for depth, block in enumerate(model.blocks, start=1):
+                x = block(x)
+                head = self.heads.get(depth)
+                if head is None or depth == num_blocks:
+                    continue
+                mean, std = head.predict(x[:, 0])
+                done = (std < self.threshold).cpu().numpy()
+                if done.any():
+                    scores[active[done]] = mean[done].clamp(0, 10).float().cpu().numpy()
+                    blocks[active[done]] = depth
+                    active = active[~done]
+                    if not len(active):
+                        return scores, blocks
+                    x = x[torch.from_numpy(~done).to(x.device)]
+            cls = model.norm(x)[:, 0].float().cpu().numpy()
+        scores[active] = self.predictor.score_embeddings(cls)
+        return scores, blocks
+
+    def predict_batch(self, images):
+        """Score a list of PIL images; returns (scores, blocks executed per image)."""
+        if not images:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        return self.score_pixels(torch.from_numpy(self.predictor.fused_preprocess.batch(images)))
+
+    def predict(self, pil_image):
+        return float(self.predict_batch([pil_image])[0][0])
+
+
+@torch.no_grad()
+def evaluate(predictor, heads, batches, thresholds=(DEFAULT_THRESHOLD,)):
+    """Compare early exit at each threshold with the full model on preprocessed batches.
+
+    Returns one dict per threshold with the average blocks executed, the
+    number of images leaving at each block, the mean, 95th percentile and max
+    absolute score drift from the full model, and the measured speedup.
+    """
+    start = time.perf_counter()
+    reference = np.concatenate([predictor.score_embeddings(predictor._embed_tensor(pixels)) for pixels in batches])
+    full_time = time.perf_counter() - start
+
+    num_blocks = len(predictor.model.blocks)
+    report = []
+    for threshold in thresholds:
+        scorer = EarlyExitScorer(predictor, heads, threshold)
+        start = time.perf_counter()
+        results = [scorer.score_pixels(pixels) for pixels in batches]
+        elapsed = time.perf_counter() - start
+        scores = np.concatenate([r[0] for r in results])
+        blocks = np.concatenate([r[1] for r in results])
+        drift = np.abs(scores - reference)
+        report.append({
+            "threshold": threshold,
+            "images": len(scores),
+            "avg_blocks": float(blocks.mean()),
+            "exits": {int(b): int((blocks == b).sum()) for b in sorted(set(heads) | {num_blocks})},
+            "mean_abs_drift": float(drift.mean()),
+            "p95_abs_drift": float(np.percentile(drift, 95)),
+            "max_abs_drift": float(drift.max()),
+            "speedup": full_time / elapsed,
+        })
+    return report
+
+
+def _load_predictor(args):
+    from laion_aesthetic_predictor import LAIONAestheticPredictor
+
+    return LAIONAestheticPredictor(device=args.device, precision=args.precision, bundle=args.bundle)
+
+
+def _sources(source, limit=None):
+    from score import iter_inputs
+
+    paths = [path for _, path in iter_inputs(source)]
+    return paths[:limit] if limit else paths
+
+
+def train(args):
+    paths = _sources(args.source, args.limit)
+    if len(paths) < 2:
+        print(f"❌ Need at least 2 images, found {len(paths)}")
+        return 1
+    predictor = _load_predictor(args)
+    if not all(1 <= block < len(predictor.model.blocks) for block in args.blocks):
+        print(f"❌ Exit blocks must be between 1 and {len(predictor.model.blocks) - 1}")
+        return 1
+    print(f"Running the full backbone on {len(paths)} images")
+    features, targets = collect_exit_features(predictor, paths, tuple(args.blocks), args.batch_size, args.workers)
+
+    heads = {}
+    for block in args.blocks:
+        heads[block], mae = train_exit_head(features[block], targets, epochs=args.epochs, lr=args.lr,
+                                            val_fraction=args.val_fraction, seed=args.seed)
+        print(f"Block {block}: held-out MAE {mae:.3f}, uncertainty scale {float(heads[block].scale):.2f}")
+    save_exit_heads(heads, args.output, precision=predictor.precision, images=len(targets))
+    print(f"✅ Saved exit heads to {args.output}")
+    return 0
+
+
+def report(args):
+    paths = _sources(args.source, args.limit)
+    predictor = _load_predictor(args)
+    heads = load_exit_heads(args.heads, predictor.device)
+    # Decode once up front so both models are timed on inference alone
+    batches = load_pixel_batches(predictor, paths, args.batch_size, args.workers)
+    if not batches:
+        print("❌ No input image could be decoded")
+        return 1
+    print(f"{'threshold':>9}  {'avg blocks':>10}  {'mean drift':>10}  {'p95 drift':>9}  {'max drift':>9}  {'speedup':>7}  exits per block")
+    for row in evaluate(predictor, heads, batches, args.threshold):
+        exits = ", ".join(f"{block}: {count}" for block, count in row["exits"].items())
+        print(f"{row['threshold']:>9.3f}  {row['avg_blocks']:>10.2f}  {row['mean_abs_drift']:>10.3f}  "
+              f"{row['p95_abs_drift']:>9.3f}  {row['max_abs_drift']:>9.3f}  {row['speedup']:>6.2f}x  {exits}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Train and evaluate early-exit heads on intermediate ViT blocks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(command):
+        command.add_argument("source", help="Image directory, glob or .jsonl manifest")
+        command.add_argument("--limit", type=int, default=None, help="Use at most this many images")
+        command.add_argument("--batch-size", type=int, default=32)
+        command.add_argument("--workers", type=int, default=None, help="Decode workers (default: CPU count)")
+        command.add_argument("--device", default=None)
+        command.add_argument("--precision", choices=PRECISIONS, default=os.environ.get("AESTHETIC_PRECISION", "fp32"))
+        command.add_argument("--bundle", default=None, help="Model bundle to load (see model_bundle.py)")
+
+    train_parser = commands.add_parser("train", help="Distill exit heads from the full model")
+    add_common(train_parser)
+    train_parser.add_argument("--output", default=str(EXIT_HEADS_PATH))
+    train_parser.add_argument("--blocks", type=int, nargs="+", default=list(EXIT_BLOCKS),
+                              help="1-based blocks to attach exit heads to")
+    train_parser.add_argument("--epochs", type=int, default=100)
+    train_parser.add_argument("--lr", type=float, default=1e-3)
+    train_parser.add_argument("--val-fraction", type=float, default=0.2)
+    train_parser.add_argument("--seed", type=int, default=0)
+    train_parser.set_defaults(handler=train)
+
+    report_parser = commands.add_parser("report", help="Average blocks executed and score drift per threshold")
+    add_common(report_parser)
+    report_parser.add_argument("--heads", default=str(EXIT_HEADS_PATH))
+    report_parser.add_argument("--threshold", type=float, nargs="+", default=[DEFAULT_THRESHOLD],
+                               help="Uncertainty thresholds (score points) to compare")
+    report_parser.set_defaults(handler=report)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
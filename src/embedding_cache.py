@@ -0,0 +1,101 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def embedding_key(data, config):
+    """Content address for an embedding: hash of the image bytes plus the preprocessing config."""
+    h = hashlib.sha256()
+    h.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    h.update(b"\0")
+    h.update(data)
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """Cache of backbone CLS embeddings with a bounded in-memory LRU tier and an optional on-disk tier."""
+
+    def __init__(self, max_items=4096, cache_dir=None):
+        if max_items < 1:
+            raise ValueError("max_items must be at least 1")
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._memory)
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._memory:
+                return True
+        path = self._disk_path(key)
+        return path is not None and os.path.exists(path)
+
+    def _disk_path(self, key):
+        if self.cache_dir is None:
+            return None
+        # Shard by prefix so a large cache does not put every file in one directory
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def _remember(self, key, embedding):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached embedding for `key`, or None."""
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+        path = self._disk_path(key)
+        if path is not None and os.path.exists(path):
+            try:
+                embedding = np.load(path)
+            except (OSError, ValueError):
+                # A corrupt entry is just a miss; it gets rewritten on the next put
+                embedding = None
+            if embedding is not None:
+                with self._lock:
+                    self._remember(key, embedding)
+                    self.hits += 1
+                return embedding
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, embedding):
+        """Store an embedding in memory and, if configured, on disk."""
+        # An owned copy: a row view would keep the caller's whole batch array alive
+        embedding = np.array(embedding, dtype=np.float32, copy=True)
+        embedding.setflags(write=False)
+        with self._lock:
+            self._remember(key, embedding)
+
+        path = self._disk_path(key)
+        if path is not None and not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, embedding)
+            os.replace(tmp_path, path)
+
+    def clear(self):
+        """Drop the in-memory tier. The on-disk tier is left untouched."""
+        with self._lock:
+            self._memory.clear()
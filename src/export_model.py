@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Export the aesthetic model (ViT backbone + CLS token + MLP head) as a single
+TorchScript and/or ONNX graph, for use with ExportedAestheticPredictor.
+
+    python src/export_model.py --format both --output-dir models
+"""
+
+import os
+import sys
+import json
+import argparse
+
+import torch
+
+from laion_aesthetic_predictor import LAIONAestheticPredictor
+from preprocessing import IMAGE_SIZE
+from exported_predictor import EXPORT_BASENAME, EXPORT_DIR
+
+
+class ScoringGraph(torch.nn.Module):
+    """Backbone, CLS selection and head as one module returning (scores, embeddings)."""
+
+    def __init__(self, backbone, head):
+        super().__init__()
+        self.backbone = backbone
+        self.head = head
+
+    def forward(self, pixels):
+        features = self.backbone.forward_features(pixels)[:, 0, :]
+        scores = self.head(features).squeeze(1).clamp(0, 10)
+        return scores, features
+
+
+def export_torchscript(graph, example, path):
+    traced = torch.jit.trace(graph, example)
+    # Freezing inlines the weights as constants so ops can be folded. The
+    # CPU-specific fusions (optimize_for_inference) are applied at load time,
+    # since their mkldnn ops do not survive serialization
+    torch.jit.freeze(traced).save(path)
+
+
+def export_onnx(graph, example, path):
+    kwargs = {}
+    if "dynamo" in torch.onnx.export.__code__.co_varnames:
+        # The classic exporter handles timm's ViT without onnxscript
+        kwargs["dynamo"] = False
+    torch.onnx.export(
+        graph,
+        (example,),
+        path,
+        input_names=["pixels"],
+        output_names=["scores", "embeddings"],
+        dynamic_axes={"pixels": {0: "batch"}, "scores": {0: "batch"}, "embeddings": {0: "batch"}},
+        opset_version=17,
+        **kwargs,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the aesthetic model as TorchScript and/or ONNX")
+    parser.add_argument("--format", choices=["torchscript", "onnx", "both"], default="both")
+    parser.add_argument("--output-dir", default=EXPORT_DIR)
+    args = parser.parse_args()
+
+    predictor = LAIONAestheticPredictor(device="cpu")
+    graph = ScoringGraph(predictor.model, predictor.linear).eval()
+    example = torch.zeros(1, 3, IMAGE_SIZE, IMAGE_SIZE)
+    os.makedirs(args.output_dir, exist_ok=True)
+    base = os.path.join(args.output_dir, EXPORT_BASENAME)
+
+    with torch.no_grad():
+        if args.format in ("torchscript", "both"):
+            export_torchscript(graph, example, base + ".pt")
+            print(f"Saved TorchScript graph to {base}.pt")
+        if args.format in ("onnx", "both"):
+            export_onnx(graph, example, base + ".onnx")
+            print(f"Saved ONNX graph to {base}.onnx")
+
+    # Preprocessing the exported graph expects; read back by ExportedAestheticPredictor
+    with open(base + ".json", "w") as f:
+        json.dump(predictor.preprocess_config, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
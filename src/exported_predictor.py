@@ -0,0 +1,98 @@
+import os
+import io
+import json
+
+import numpy as np
+from PIL import Image
+
+from preprocessing import IMAGE_SIZE, CLIP_MEAN, CLIP_STD, FusedPreprocessor, open_image
+
+EXPORT_DIR = "models"
+EXPORT_BASENAME = "aesthetic_scorer"
+
+
+class ExportedAestheticPredictor:
+    """Runs a graph written by export_model.py without importing timm.
+
+    `.onnx` files run on ONNX Runtime (no torch needed at all); `.pt` files are
+    TorchScript and need only torch. Preprocessing is read from the JSON file
+    written next to the graph, so scores match LAIONAestheticPredictor.
+    """
+
+    def __init__(self, path=None, num_threads=None):
+        if path is None:
+            onnx_path = os.path.join(EXPORT_DIR, EXPORT_BASENAME + ".onnx")
+            path = onnx_path if os.path.exists(onnx_path) else os.path.join(EXPORT_DIR, EXPORT_BASENAME + ".pt")
+        self.path = path
+
+        config_path = os.path.splitext(path)[0] + ".json"
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                self.preprocess_config = json.load(f)
+        else:
+            self.preprocess_config = {"size": IMAGE_SIZE, "mean": CLIP_MEAN, "std": CLIP_STD, "draft_min_size": IMAGE_SIZE * 2}
+        self.fused_preprocess = FusedPreprocessor(
+            self.preprocess_config["size"], self.preprocess_config["mean"], self.preprocess_config["std"]
+        )
+
+        if path.endswith(".onnx"):
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            if num_threads is not None:
+                options.intra_op_num_threads = num_threads
+            self._session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+            self._run = self._run_onnx
+        else:
+            import torch
+
+            if num_threads is not None:
+                torch.set_num_threads(num_threads)
+            self._module = torch.jit.optimize_for_inference(torch.jit.load(path, map_location="cpu").eval())
+            self._run = self._run_torchscript
+
+    def _run_onnx(self, batch):
+        scores, features = self._session.run(None, {"pixels": batch})
+        return scores, features
+
+    def _run_torchscript(self, batch):
+        import torch
+
+        with torch.no_grad():
+            scores, features = self._module(torch.from_numpy(batch))
+        return scores.numpy(), features.numpy()
+
+    def predict(self, pil_image):
+        if not isinstance(pil_image, Image.Image):
+            raise ValueError("Input must be a PIL.Image.Image")
+        return float(self.predict_batch([pil_image])[0])
+
+    def predict_bytes(self, data):
+        """Score an encoded image, decoding JPEGs at reduced size."""
+        return self.predict(open_image(io.BytesIO(data), min_size=self.preprocess_config.get("draft_min_size")))
+
+    def predict_batch(self, images, batch_size=32):
+        """Score an iterable of PIL images in chunks of `batch_size`; returns a NumPy array."""
+        return self._batched(images, batch_size, 0)
+
+    def embed_batch(self, images, batch_size=32):
+        """Return the (N, 768) CLS embeddings for an iterable of PIL images."""
+        return self._batched(images, batch_size, 1)
+
+    def _batched(self, images, batch_size, output):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        results = []
+        chunk = []
+        for pil_image in images:
+            if not isinstance(pil_image, Image.Image):
+                raise ValueError("Input must be a PIL.Image.Image")
+            chunk.append(pil_image)
+            if len(chunk) == batch_size:
+                results.append(self._run(self.fused_preprocess.batch(chunk))[output])
+                chunk = []
+        if chunk:
+            results.append(self._run(self.fused_preprocess.batch(chunk))[output])
+        if not results:
+            return np.empty((0,) if output == 0 else (0, 768), dtype=np.float32)
+        return np.concatenate(results).astype(np.float32, copy=False)
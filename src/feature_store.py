@@ -0,0 +1,184 @@
+import os
+import json
+import shutil
+
+import numpy as np
+
+FEATURE_STORE_PATH = os.path.join("data", "processed", "features")
+FEATURE_DIM = 768
+
+MATRIX_FILE = "embeddings.f32"
+IDS_FILE = "image_ids.txt"
+META_FILE = "meta.json"
+
+
+class FeatureStore:
+    """On-disk store of CLS embeddings.
+
+    The embeddings live in one contiguous float32 matrix that is memory-mapped
+    on read, next to a newline-separated list of `image_id`s (row order) and a
+    small meta.json. meta.json is only rewritten after the rows and ids are on
+    disk, so a crash mid-append leaves the store at its previous length.
+    """
+
+    def __init__(self, path=FEATURE_STORE_PATH, dim=None):
+        self.path = path
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if dim is not None and dim != meta["dim"]:
+                raise ValueError(f"Feature store at {path} has dim {meta['dim']}, not {dim}")
+        else:
+            os.makedirs(path, exist_ok=True)
+            meta = {"version": 1, "dtype": "float32", "dim": dim or FEATURE_DIM, "count": 0, "ids_bytes": 0}
+            self._write_meta(meta)
+        self.dim = meta["dim"]
+        self._meta = meta
+        self._matrix = None
+        self._image_ids = None
+        self._index = None
+
+    def __len__(self):
+        return self._meta["count"]
+
+    def __contains__(self, image_id):
+        return image_id in self.index
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _write_meta(self, meta):
+        tmp_path = self._file(META_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._file(META_FILE))
+
+    @property
+    def matrix(self):
+        """Read-only (count, dim) float32 view of every embedding, memory-mapped from disk."""
+        if self._matrix is None:
+            count = len(self)
+            if count == 0:
+                self._matrix = np.empty((0, self.dim), dtype=np.float32)
+            else:
+                self._matrix = np.memmap(self._file(MATRIX_FILE), dtype=np.float32, mode="r", shape=(count, self.dim))
+        return self._matrix
+
+    @property
+    def image_ids(self):
+        if self._image_ids is None:
+            if len(self) == 0:
+                self._image_ids = []
+            else:
+                # Only the committed prefix; anything past ids_bytes is from an interrupted append
+                with open(self._file(IDS_FILE), "rb") as f:
+                    data = f.read(self._meta["ids_bytes"])
+                # split("\n"), not splitlines(): ids may hold other line-break characters
+                self._image_ids = data.decode("utf-8").split("\n")[:-1]
+        return self._image_ids
+
+    @property
+    def index(self):
+        """Mapping of image_id to row number, built on first use."""
+        if self._index is None:
+            self._index = {image_id: row for row, image_id in enumerate(self.image_ids)}
+        return self._index
+
+    def rows(self, image_ids):
+        """Row numbers for `image_ids`; raises KeyError for unknown ids."""
+        index = self.index
+        return np.array([index[image_id] for image_id in image_ids], dtype=np.int64)
+
+    def get(self, image_ids):
+        """Return a (len(image_ids), dim) array, reading only the requested rows."""
+        return np.asarray(self.matrix[self.rows(image_ids)])
+
+    def append(self, image_ids, embeddings):
+        """Append a chunk of embeddings. Ids must be new and must not contain newlines."""
+        image_ids = [str(image_id) for image_id in image_ids]
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of shape (n, {self.dim}), got {embeddings.shape}")
+        if len(image_ids) != len(embeddings):
+            raise ValueError("image_ids and embeddings must have the same length")
+        if len(set(image_ids)) != len(image_ids):
+            raise ValueError("Duplicate image_id in chunk")
+        for image_id in image_ids:
+            if "\n" in image_id or "\r" in image_id:
+                raise ValueError(f"image_id may not contain newlines: {image_id!r}")
+            if image_id in self.index:
+                raise ValueError(f"image_id already in feature store: {image_id!r}")
+        if not image_ids:
+            return
+
+        count = len(self)
+        ids_data = "".join(f"{image_id}\n" for image_id in image_ids).encode("utf-8")
+
+        # Truncate first so bytes left behind by an interrupted append are discarded
+        with open(self._file(MATRIX_FILE), "ab") as f:
+            f.truncate(count * self.dim * 4)
+            f.write(embeddings.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._file(IDS_FILE), "ab") as f:
+            f.truncate(self._meta["ids_bytes"])
+            f.write(ids_data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        meta = dict(self._meta, count=count + len(image_ids), ids_bytes=self._meta["ids_bytes"] + len(ids_data))
+        self._write_meta(meta)
+        self._meta = meta
+
+        self._matrix = None
+        for row, image_id in enumerate(image_ids, start=count):
+            self.image_ids.append(image_id)
+            self._index[image_id] = row
+
+    @classmethod
+    def from_dataframe(cls, df, path=FEATURE_STORE_PATH, id_column="image_id", feature_column=None, chunk_size=10000):
+        """Build a new store from a DataFrame holding one vector column or one column per dimension.
+
+        `feature_column` names the vector column, or is a list of per-dimension
+        columns. Without it, the one column holding arrays is used; failing
+        that, the numeric columns if there are exactly FEATURE_DIM of them.
+        Anything else (say, a score column next to the vectors) raises rather
+        than guessing. The store is written to a temporary directory and
+        renamed into place when complete, so a failed conversion leaves nothing
+        at `path`.
+        """
+        if feature_column is None:
+            rest = df.drop(columns=[id_column])
+            vector_columns = [name for name in rest.columns
+                              if len(rest) and isinstance(rest[name].iloc[0], (np.ndarray, list, tuple))]
+            numeric_columns = list(rest.select_dtypes("number").columns)
+            if len(vector_columns) == 1:
+                feature_column = vector_columns[0]
+            elif not vector_columns and len(numeric_columns) == FEATURE_DIM:
+                feature_column = numeric_columns
+            else:
+                raise ValueError(f"Cannot tell which of the columns {list(rest.columns)} hold the features; "
+                                 "pass feature_column")
+        if isinstance(feature_column, (list, tuple)):
+            features = df[list(feature_column)].to_numpy(dtype=np.float32)
+        else:
+            features = np.stack(df[feature_column].to_numpy()).astype(np.float32)
+        if features.ndim != 2 or features.shape[1] == 0:
+            raise ValueError(f"Expected (n, dim) features with dim > 0, got shape {features.shape}")
+
+        if os.path.exists(os.path.join(path, META_FILE)):
+            raise ValueError(f"A feature store already exists at {path}")
+        tmp_path = path.rstrip(os.sep) + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)  # Left by an earlier failed conversion
+        store = cls(tmp_path, dim=features.shape[1])
+        image_ids = df[id_column].astype(str).tolist()
+        for start in range(0, len(image_ids), chunk_size):
+            store.append(image_ids[start:start + chunk_size], features[start:start + chunk_size])
+        if os.path.isdir(path):
+            os.rmdir(path)  # An empty directory; a non-empty one makes this fail rather than be overwritten
+        os.replace(tmp_path, path)
+        return cls(path)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Fine-tune the aesthetic head on your own photos.
+
+Reads data/custom_training/scores.csv (columns: filename, score) with images
+in data/custom_training/images, embeds each image once with the ViT backbone
+(decoding in parallel; embeddings are kept in a FeatureStore keyed by
+content, so reruns only embed new or changed photos), then trains only AestheticMLP on the
+cached CLS features and writes models/aesthetic_model_finetuned.pth
+atomically. Progress is printed line by line as it happens:
+
+    python src/finetune_model.py
+    python src/finetune_model.py --epochs 300 --lr 5e-5
+"""
+
+import os
+import sys
+import csv
+import copy
+import time
+import argparse
+
+import numpy as np
+
+DATA_DIR = os.path.join("data", "custom_training")
+# FeatureStore under the data dir; embeddings are keyed by image bytes + preprocessing config
+EMBEDDING_STORE_SUBDIR = ".embeddings"
+
+
+def log(message):
+    # The app reads this process's stdout line by line; flush so it sees progress live
+    print(message, flush=True)
+
+
+def read_scores(csv_path, image_dir):
+    """Return [(path, score)] for rows whose image exists; scores must be in [0, 10]."""
+    rows = []
+    with open(csv_path, newline="") as f:
+        reader = csv.DictReader(f)
+        fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+        file_field = next((fields[name] for name in ("filename", "image", "file", "path") if name in fields), None)
+        score_field = fields.get("score")
+        if file_field is None or score_field is None:
+            raise SystemExit(f"❌ {csv_path} needs a filename and a score column, found {reader.fieldnames}")
+        for line, row in enumerate(reader, start=2):
+            name = row[file_field].strip()
+            try:
+                score = float(row[score_field])
+            except ValueError:
+                log(f"⚠️ Line {line}: score {row[score_field]!r} is not a number, skipping")
+                continue
+            if not 0 <= score <= 10:
+                log(f"⚠️ Line {line}: score {score} is outside 0-10, skipping")
+                continue
+            path = name if os.path.isabs(name) else os.path.join(image_dir, name)
+            if not os.path.exists(path):
+                log(f"⚠️ Line {line}: {path} not found, skipping")
+                continue
+            rows.append((path, score))
+    return rows
+
+
+def embed_images(predictor, paths, store, batch_size=32, workers=None):
+    """CLS embeddings for `paths` as an (N, 768) array (rows of NaN for undecodable images).
+
+    `store` is a FeatureStore keyed by embedding_key (image bytes plus the
+    predictor's preprocessing), so other training and rescoring tools can
+    read the same features. Images embedded before come from it; the rest go
+    through embed_stream's worker pool and are appended after each batch.
+    """
+    from embedding_cache import embedding_key
+
+    features = np.full((len(paths), store.dim), np.nan, dtype=np.float32)
+    rows_by_key = {}
+    for i, path in enumerate(paths):
+        with open(path, "rb") as f:
+            rows_by_key.setdefault(embedding_key(f.read(), predictor.preprocess_config), []).append(i)
+    # One backbone pass per distinct image, even if the CSV lists it twice
+    missing = []
+    for key, rows in rows_by_key.items():
+        if key in store:
+            features[rows] = store.get([key])[0]
+        else:
+            missing.append(key)
+    log(f"Embeddings: {len(rows_by_key) - len(missing)} stored, {len(missing)} to compute")
+
+    done = 0
+    start = time.time()
+    stream = predictor.embed_stream([paths[rows_by_key[key][0]] for key in missing], batch_size=batch_size, workers=workers)
+    for indices, batch_features, failures in stream:
+        for index, error in failures:
+            log(f"⚠️ Could not read {paths[rows_by_key[missing[index]][0]]}: {error}")
+        for index, f in zip(indices, batch_features):
+            features[rows_by_key[missing[index]]] = f
+        if indices:
+            store.append([missing[index] for index in indices], batch_features)
+        done += len(indices) + len(failures)
+        log(f"Embedded {done}/{len(missing)} images ({done / max(time.time() - start, 1e-9):.1f} images/s)")
+    return features
+
+
+def train_head(head, features, targets, epochs=200, lr=1e-4, weight_decay=1e-4, batch_size=64,
+               val_fraction=0.2, patience=30, seed=0, log_every=10):
+    """Train `head` (in place) on precomputed features; returns the best validation (or training) MSE.
+
+    With at least 10 samples, `val_fraction` of them are held out and the
+    weights with the lowest validation loss are kept (early stopping after
+    `patience` epochs without improvement).
+    """
+    import torch
+
+    generator = torch.Generator().manual_seed(seed)
+    x = torch.from_numpy(features)
+    y = torch.tensor(targets, dtype=torch.float32)
+    order = torch.randperm(len(x), generator=generator)
+    n_val = int(len(x) * val_fraction) if len(x) >= 10 else 0
+    val_idx, train_idx = order[:n_val], order[n_val:]
+
+    optimizer = torch.optim.AdamW(head.parameters(), lr=lr, weight_decay=weight_decay)
+    loss_fn = torch.nn.MSELoss()
+    best_loss, best_state, best_epoch = float("inf"), copy.deepcopy(head.state_dict()), 0
+
+    for epoch in range(1, epochs + 1):
+        head.train()
+        train_loss = 0.0
+        for batch in train_idx[torch.randperm(len(train_idx), generator=generator)].split(batch_size):
+            optimizer.zero_grad()
+            loss = loss_fn(head(x[batch]).squeeze(1), y[batch])
+            loss.backward()
+            optimizer.step()
+            train_loss += loss.item() * len(batch)
+        train_loss /= len(train_idx)
+
+        head.eval()
+        with torch.no_grad():
+            val_loss = loss_fn(head(x[val_idx]).squeeze(1), y[val_idx]).item() if n_val else train_loss
+        if val_loss < best_loss:
+            best_loss, best_state, best_epoch = val_loss, copy.deepcopy(head.state_dict()), epoch
+
+        if epoch % log_every == 0 or epoch == 1 or epoch == epochs:
+            val_text = f"  val_loss {val_loss:.4f}" if n_val else ""
+            log(f"Epoch {epoch}/{epochs}  train_loss {train_loss:.4f}{val_text}")
+        if n_val and epoch - best_epoch >= patience:
+            log(f"Stopping early: no improvement since epoch {best_epoch}")
+            break
+
+    head.load_state_dict(best_state)
+    head.eval()
+    return best_loss
+
+
+def save_head_weights(head, path):
+    """Write the head's state dict to `path` atomically (readers never see a partial file)."""
+    import torch
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        torch.save({k: v.detach().cpu() for k, v in head.state_dict().items()}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def main():
+    from laion_aesthetic_predictor import FINETUNED_WEIGHTS_PATH
+
+    parser = argparse.ArgumentParser(description="Fine-tune the aesthetic head on cached embeddings")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--csv", default=None, help="Defaults to DATA_DIR/scores.csv")
+    parser.add_argument("--images", default=None, help="Defaults to DATA_DIR/images")
+    parser.add_argument("--output", default=str(FINETUNED_WEIGHTS_PATH))
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--weight-decay", type=float, default=1e-4)
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    parser.add_argument("--patience", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=32, help="Images per backbone pass")
+    parser.add_argument("--workers", type=int, default=None, help="Decode workers (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    csv_path = args.csv or os.path.join(args.data_dir, "scores.csv")
+    image_dir = args.images or os.path.join(args.data_dir, "images")
+    if not os.path.exists(csv_path):
+        log(f"❌ {csv_path} not found")
+        return 1
+    rows = read_scores(csv_path, image_dir)
+    if len(rows) < 2:
+        log(f"❌ Need at least 2 scored images, found {len(rows)}")
+        return 1
+    log(f"Found {len(rows)} scored images")
+
+    import torch
+    from feature_store import FeatureStore
+    from laion_aesthetic_predictor import LAIONAestheticPredictor
+
+    start = time.time()
+    predictor = LAIONAestheticPredictor()
+    log(f"Loaded model in {time.time() - start:.1f}s")
+
+    store = FeatureStore(os.path.join(args.data_dir, EMBEDDING_STORE_SUBDIR), dim=predictor.linear.layers[0].in_features)
+    paths, targets = zip(*rows)
+    features = embed_images(predictor, list(paths), store, args.batch_size, args.workers)
+    valid = ~np.isnan(features).any(axis=1)
+    if valid.sum() < 2:
+        log("❌ Fewer than 2 images could be embedded")
+        return 1
+    features, targets = features[valid], np.asarray(targets, dtype=np.float32)[valid]
+
+    # Start from the head the app currently uses (base or previous fine-tune); the backbone stays frozen
+    head = copy.deepcopy(predictor.linear).float().cpu()
+    with torch.no_grad():
+        before = float(((head(torch.from_numpy(features)).squeeze(1).numpy() - targets) ** 2).mean())
+    log(f"Training the head on {len(features)} embeddings (MSE before: {before:.4f})")
+    start = time.time()
+    best = train_head(head, features, targets, epochs=args.epochs, lr=args.lr, weight_decay=args.weight_decay,
+                      val_fraction=args.val_fraction, patience=args.patience, seed=args.seed)
+    log(f"Trained in {time.time() - start:.1f}s (best loss {best:.4f})")
+
+    save_head_weights(head, args.output)
+    log(f"✅ Saved fine-tuned head to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
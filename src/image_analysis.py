@@ -0,0 +1,72 @@
+import numpy as np
+from PIL import Image
+
+from image_stats import compute_image_stats, to_gray
+from preprocessing import open_image
+
+# Longest side of the image the statistics (and the model) work from
+WORKING_SIZE = 1024
+# Longest side of the thumbnail used for colour analysis
+THUMBNAIL_SIZE = 100
+
+
+def _fit(image, max_side):
+    """`image` scaled down (never up) so its longest side is at most `max_side`; no copy if it already fits."""
+    width, height = image.size
+    scale = max_side / max(width, height)
+    if scale >= 1:
+        return image
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return image.resize(size, Image.BICUBIC, reducing_gap=2.0)
+
+
+class AnalysisContext:
+    """One upload, decoded once and shared by every per-image analysis.
+
+    The image is decoded with JPEG DCT scaling where possible, oriented,
+    converted to RGB and capped at `working_size` on its longest side. The
+    grayscale plane, pixel array and colour thumbnail are derived from that
+    working image on first use and kept, so no analysis touches the
+    full-resolution upload or repeats a conversion another one already did.
+    """
+
+    def __init__(self, image, working_size=WORKING_SIZE, thumbnail_size=THUMBNAIL_SIZE):
+        self.image = _fit(image, working_size)
+        self.thumbnail_size = thumbnail_size
+        self._array = None
+        self._gray = None
+        self._thumbnail = None
+        self._stats = None
+
+    @classmethod
+    def from_upload(cls, source, working_size=WORKING_SIZE, **kwargs):
+        """Build a context from a path, file object or bytes."""
+        return cls(open_image(source, min_size=working_size), working_size, **kwargs)
+
+    @property
+    def array(self):
+        """The working image as an (H, W, 3) uint8 array, without copying the pixels twice."""
+        if self._array is None:
+            self._array = np.asarray(self.image)
+        return self._array
+
+    @property
+    def gray(self):
+        """The (H, W) uint8 luminance plane (ITU-R 601, like cv2.COLOR_RGB2GRAY)."""
+        if self._gray is None:
+            self._gray = to_gray(self.array)
+        return self._gray
+
+    @property
+    def thumbnail(self):
+        """A small (h, w, 3) uint8 RGB thumbnail for colour analysis."""
+        if self._thumbnail is None:
+            self._thumbnail = np.asarray(_fit(self.image, self.thumbnail_size))
+        return self._thumbnail
+
+    @property
+    def stats(self):
+        """compute_image_stats for the working image, computed once from the cached gray plane."""
+        if self._stats is None:
+            self._stats = compute_image_stats(self.array, gray=self.gray)
+        return self._stats
@@ -0,0 +1,129 @@
+import numpy as np
+
+# Sharpness measures compute_image_stats can report
+SHARPNESS_MEASURES = ("laplacian", "gradient", "diff")
+
+# ITU-R 601 luma in 15-bit fixed point, exactly as cv2.COLOR_RGB2GRAY rounds it
+_LUMA_SHIFT = 15
+_LUMA_WEIGHTS = (9798, 19235, 3735)
+
+# cv2.calcHist counts in float32, which stops being exact past 2**24 per bin
+_CALCHIST_MAX_PIXELS = 1 << 24
+
+_cv2 = None
+
+
+def _opencv():
+    """cv2 if it is installed (imported on first use), else None."""
+    global _cv2
+    if _cv2 is None:
+        try:
+            import cv2
+
+            _cv2 = cv2
+        except ImportError:
+            _cv2 = False
+    return _cv2 or None
+
+
+def to_gray(rgb, use_opencv=None):
+    """(H, W, 3) uint8 RGB -> (H, W) uint8 luma; identical with and without OpenCV."""
+    cv2 = _opencv() if use_opencv is not False else None
+    if cv2 is not None:
+        return cv2.cvtColor(np.ascontiguousarray(rgb), cv2.COLOR_RGB2GRAY)
+    acc = np.multiply(rgb[..., 0], _LUMA_WEIGHTS[0], dtype=np.uint32)
+    acc += np.multiply(rgb[..., 1], _LUMA_WEIGHTS[1], dtype=np.uint32)
+    acc += np.multiply(rgb[..., 2], _LUMA_WEIGHTS[2], dtype=np.uint32)
+    acc += 1 << (_LUMA_SHIFT - 1)
+    acc >>= _LUMA_SHIFT
+    return acc.astype(np.uint8)
+
+
+def _histogram(plane, cv2):
+    if cv2 is not None and plane.size < _CALCHIST_MAX_PIXELS:
+        return cv2.calcHist([np.ascontiguousarray(plane)], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+    return np.bincount(plane.ravel(), minlength=256).astype(np.int64)
+
+
+def _laplacian(gray, cv2):
+    """4-neighbour Laplacian (cv2.Laplacian ksize=1) as int16, reflect-101 borders."""
+    if cv2 is not None:
+        return cv2.Laplacian(gray, cv2.CV_16S, ksize=1)
+    p = np.pad(gray, 1, mode="reflect").astype(np.int16)
+    return p[:-2, 1:-1] + p[2:, 1:-1] + p[1:-1, :-2] + p[1:-1, 2:] - 4 * p[1:-1, 1:-1]
+
+
+def _sobel(gray, cv2):
+    """3x3 Sobel x and y gradients as int16, mirrored borders (scipy.ndimage.sobel's default)."""
+    if cv2 is not None:
+        gx = cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3, borderType=cv2.BORDER_REFLECT)
+        gy = cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3, borderType=cv2.BORDER_REFLECT)
+        return gx, gy
+    p = np.pad(gray, 1, mode="symmetric").astype(np.int16)
+    rows = p[:-2] + 2 * p[1:-1] + p[2:]
+    cols = p[:, :-2] + 2 * p[:, 1:-1] + p[:, 2:]
+    return rows[:, 2:] - rows[:, :-2], cols[2:] - cols[:-2]
+
+
+def _mean_var(values):
+    """Mean and population variance of an integer array, from exact int64 sums."""
+    n = values.size
+    if n == 0:
+        return 0.0, 0.0
+    wide = values.astype(np.int32, copy=False)
+    total = int(wide.sum(dtype=np.int64))
+    squares = int(np.square(wide).sum(dtype=np.int64))
+    mean = total / n
+    return mean, max(squares / n - mean * mean, 0.0)
+
+
+def compute_image_stats(image, gray=None, sharpness=SHARPNESS_MEASURES, histograms=True, use_opencv=None):
+    """Brightness, contrast, sharpness measures and histograms of a uint8 image.
+
+    `image` is an (H, W, 3) RGB or (H, W) grayscale uint8 array (or PIL image);
+    pass `gray` if its luma plane is already at hand. Everything is computed in
+    integer arithmetic on that one plane, so the OpenCV path (used when cv2 is
+    installed, unless `use_opencv=False`) and the NumPy path return the same
+    numbers. Returns a dict with:
+
+    - brightness, contrast: mean and standard deviation of the luma (0-255)
+    - laplacian_var: variance of the 4-neighbour Laplacian
+    - gradient_mean: mean 3x3 Sobel gradient magnitude
+    - diff_std: std of horizontal plus std of vertical neighbour differences
+    - luminance_hist: (256,) int64 luma counts
+    - channel_hists: (3, 256) int64 R, G, B counts (RGB input only)
+
+    `sharpness` selects which of "laplacian", "gradient" and "diff" to compute.
+    """
+    image = np.asarray(image)
+    if image.dtype != np.uint8:
+        raise ValueError(f"Expected a uint8 image, got {image.dtype}")
+    cv2 = _opencv() if use_opencv is not False else None
+    if gray is None:
+        gray = image if image.ndim == 2 else to_gray(image, use_opencv)
+
+    # Brightness and contrast come straight from the 256-bin luma histogram
+    luminance_hist = _histogram(gray, cv2)
+    levels = np.arange(256, dtype=np.float64)
+    n = max(gray.size, 1)
+    brightness = float(luminance_hist @ levels) / n
+    contrast = float(np.sqrt(max(float(luminance_hist @ (levels * levels)) / n - brightness * brightness, 0.0)))
+    stats = {"brightness": brightness, "contrast": contrast}
+
+    if "laplacian" in sharpness:
+        stats["laplacian_var"] = _mean_var(_laplacian(gray, cv2))[1]
+    if "gradient" in sharpness:
+        gx, gy = _sobel(gray, cv2)
+        magnitude = np.hypot(gx.astype(np.float32), gy.astype(np.float32))
+        stats["gradient_mean"] = float(magnitude.mean(dtype=np.float64)) if magnitude.size else 0.0
+    if "diff" in sharpness:
+        signed = gray.astype(np.int16)
+        _, var_x = _mean_var(np.diff(signed, axis=1))
+        _, var_y = _mean_var(np.diff(signed, axis=0))
+        stats["diff_std"] = float(np.sqrt(var_x) + np.sqrt(var_y))
+
+    if histograms:
+        stats["luminance_hist"] = luminance_hist
+        if image.ndim == 3:
+            stats["channel_hists"] = np.stack([_histogram(image[..., c], cv2) for c in range(3)])
+    return stats
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Import-time report for the app and predictor modules.
+
+Each module is imported in a fresh interpreter with `python -X importtime`,
+and the time is summed per top-level package. Use it in CI to catch
+heavy dependencies creeping back onto the import path:
+
+    python src/import_report.py app app_deploy --forbid torch timm cv2 pandas
+    python src/import_report.py laion_aesthetic_predictor --forbid timm torchvision requests --budget-ms 3000
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(module):
+    """Import `module` in a fresh interpreter and return per-package import times in ms."""
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC_DIR, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip()}")
+
+    packages = defaultdict(float)
+    total = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.rstrip()
+        packages[name.strip().split(".")[0]] += int(self_us) / 1000
+        if name == f" {module}":
+            total = int(cumulative_us) / 1000
+    return {"module": module, "total_ms": total, "packages": dict(packages)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-package import-time report")
+    parser.add_argument("modules", nargs="+", help="Modules to import, e.g. app laion_aesthetic_predictor")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list per module")
+    parser.add_argument("--budget-ms", type=float, help="Fail if a module takes longer than this to import")
+    parser.add_argument("--forbid", nargs="*", default=[], help="Fail if any of these packages is imported")
+    parser.add_argument("--json", help="Also write the full report to this file")
+    args = parser.parse_args()
+
+    reports = []
+    failures = []
+    for module in args.modules:
+        report = measure(module)
+        reports.append(report)
+
+        print(f"\n{module}: {report['total_ms']:.1f} ms")
+        ranked = sorted(report["packages"].items(), key=lambda item: item[1], reverse=True)
+        for package, ms in ranked[:args.top]:
+            print(f"  {ms:9.1f} ms  {package}")
+
+        if args.budget_ms is not None and report["total_ms"] > args.budget_ms:
+            failures.append(f"{module} took {report['total_ms']:.1f} ms (budget {args.budget_ms:.1f} ms)")
+        for package in args.forbid:
+            if package in report["packages"]:
+                failures.append(f"{module} imports {package}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+    if failures:
+        print("\n❌ Import-time check failed:")
+        for failure in failures:
+            print(f"- {failure}")
+        return 1
+    print("\n✅ Import-time check passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,34 +1,22 @@
+import io
 import os
+import copy
+import json
+import hashlib
+import time
+import threading
+import contextlib
+import numpy as np
 import torch
-from torchvision import transforms
 from PIL import Image
-import timm
-import requests
 from pathlib import Path
 
-# A custom transform to resize and pad images to a square
-class ResizeAndPad:
-    def __init__(self, output_size, fill_color=(0, 0, 0)):
-        self.output_size = output_size
-        self.fill_color = fill_color
-
-    def __call__(self, img):
-        # Create a copy to avoid modifying the original image with thumbnail
-        img = img.copy()
-        # Resize the image so that its longest side is `output_size`
-        img.thumbnail((self.output_size, self.output_size), Image.Resampling.LANCZOS)
-        
-        # Create a new square image with a black background
-        new_img = Image.new("RGB", (self.output_size, self.output_size), self.fill_color)
-        
-        # Paste the resized image into the center of the black square
-        paste_position = (
-            (self.output_size - img.width) // 2,
-            (self.output_size - img.height) // 2
-        )
-        new_img.paste(img, paste_position)
-        
-        return new_img
+from embedding_cache import embedding_key
+from preprocessing import IMAGE_SIZE, CLIP_MEAN, CLIP_STD, ResizeAndPad, FusedPreprocessor, open_image
+from prefetch import PrefetchPipeline
+from micro_batcher import MicroBatcher
+from model_bundle import BUNDLE_PATH, load_bundle, split_bundle
+from token_reduction import FastMode, ReducedTokenViT
 
 MODEL_NAME = "vit_base_patch16_224"
 AESTHETIC_WEIGHTS_URL = "https://huggingface.co/trl-lib/ddpo-aesthetic-predictor/resolve/main/aesthetic-model.pth"
@@ -36,13 +24,108 @@ AESTHETIC_WEIGHTS_PATH = os.path.join(os.path.dirname(__file__), "sa_0.4.pt")
 FINETUNED_WEIGHTS_PATH = Path("models/aesthetic_model_finetuned.pth")
 
 
-def download_weights(url, filename):
-    if not os.path.exists(filename):
-        print(f"Downloading {filename} ...")
-        r = requests.get(url)
+# Optional expected SHA-256 of the base weights, checked after download
+AESTHETIC_WEIGHTS_SHA256 = os.environ.get("AESTHETIC_WEIGHTS_SHA256")
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Exclusive inter-process lock held on `path` for the duration of the block."""
+    with open(path, "a+b") as f:
+        try:
+            import fcntl
+        except ImportError:  # Windows
+            import msvcrt
+
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after ~10 s; keep waiting
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _sha256_file(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _fetch(url, part_path, timeout, chunk_size):
+    """Stream `url` into `part_path`, resuming from its current size with an HTTP Range request."""
+    import requests
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with requests.get(url, stream=True, headers=headers, timeout=timeout) as r:
+        if offset and r.status_code == 416:
+            # Nothing left to fetch: the partial file already holds the whole payload
+            return
         r.raise_for_status()
-        with open(filename, "wb") as f:
-            f.write(r.content)
+        if r.status_code != 206:
+            # Server ignored the Range header and is sending everything again
+            offset = 0
+        with open(part_path, "ab" if offset else "wb") as f:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        expected = r.headers.get("Content-Length")
+        if expected is not None and os.path.getsize(part_path) != offset + int(expected):
+            raise IOError(f"Incomplete download of {url}")
+
+
+def download_weights(url, filename, sha256=None, timeout=(10, 60), retries=3, chunk_size=1 << 20):
+    """Download `url` to `filename` unless it already exists.
+
+    The payload is streamed to `filename + ".part"` and only renamed into place
+    once complete (and, with `sha256`, verified), so a crash never leaves a
+    truncated weights file behind; the next attempt resumes the partial file
+    with a Range request. Workers starting at the same time serialize on a lock
+    file, and all but the first find the finished file. `timeout` is the
+    requests (connect, read) timeout in seconds.
+    """
+    if os.path.exists(filename):
+        return filename
+
+    import requests
+
+    part_path = filename + ".part"
+    with _file_lock(filename + ".lock"):
+        if os.path.exists(filename):
+            return filename
+
+        print(f"Downloading {filename} ...")
+        for attempt in range(1, retries + 1):
+            try:
+                _fetch(url, part_path, timeout, chunk_size)
+                break
+            except (requests.RequestException, IOError) as e:
+                if attempt == retries:
+                    raise
+                print(f"Download interrupted ({e}); resuming (attempt {attempt + 1} of {retries})")
+
+        if sha256 is not None:
+            digest = _sha256_file(part_path)
+            if digest != sha256.lower():
+                os.remove(part_path)
+                raise ValueError(f"Checksum mismatch for {url}: expected {sha256}, got {digest}")
+        os.replace(part_path, filename)
+    return filename
 
 class AestheticMLP(torch.nn.Module):
     def __init__(self):
@@ -61,57 +144,641 @@ class AestheticMLP(torch.nn.Module):
     def forward(self, x):
         return self.layers(x)
 
+PRECISIONS = ("fp32", "int8", "bf16")
+# Name under which score_heads reports the predictor's own (possibly hot-swapped) head
+DEFAULT_HEAD = "default"
+
+
+def bf16_supported(device):
+    """Whether bf16 autocast runs natively (not emulated) on `device`."""
+    if torch.device(device).type == "cuda":
+        return torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+    checks = [getattr(torch.cpu, name, None) for name in ("_is_avx512_bf16_supported", "_is_amx_tile_supported")]
+    return any(check is not None and check() for check in checks)
+
+
+def apply_precision(module, precision):
+    """Return `module` prepared for inference at `precision`.
+
+    int8 swaps every Linear for a dynamically quantized one (weights stored as
+    int8, activations quantized per batch); the original module is not
+    modified. fp32 and bf16 leave the module as is; bf16 is applied with
+    autocast at run time.
+    """
+    if precision == "int8":
+        return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+    return module
+
+
+def head_state_dict(weights):
+    """AestheticMLP state dict from a loaded weights dict, adding the `layers.` key prefix if missing."""
+    state_dict = {}
+    for k, v in weights.items():
+        new_key = k.replace('layers.', '') if 'layers.' in k else k
+        state_dict[f'layers.{new_key}'] = v
+    return state_dict
+
+
+def head_digest(state_dict):
+    """Short sha256 of head weights (tensors or NumPy arrays), independent of key order and device."""
+    h = hashlib.sha256()
+    for name in sorted(state_dict):
+        value = state_dict[name]
+        if hasattr(value, "detach"):
+            value = value.detach().cpu().numpy()
+        h.update(name.encode("utf-8"))
+        h.update(np.ascontiguousarray(value, dtype=np.float32).tobytes())
+    return h.hexdigest()[:12]
+
+
+def load_base_head(device="cpu"):
+    """Download (if needed) the base aesthetic weights; return (state_dict, version)."""
+    download_weights(AESTHETIC_WEIGHTS_URL, AESTHETIC_WEIGHTS_PATH, sha256=AESTHETIC_WEIGHTS_SHA256)
+    base_weights = torch.load(AESTHETIC_WEIGHTS_PATH, map_location=device)
+    # Map the keys from the base model to the MLP state dict format
+    state_dict = head_state_dict(base_weights)
+    return state_dict, "base-" + head_digest(state_dict)
+
+
+def make_preprocess_config(image_size, mean, std, precision, padding_tokens=None):
+    """Everything that influences the backbone output; part of the embedding cache key."""
+    config = {
+        "model": MODEL_NAME,
+        "size": image_size,
+        "resample": "lanczos",
+        "draft_min_size": image_size * 2,
+        "mean": mean,
+        "std": std,
+        "precision": precision,
+    }
+    if padding_tokens is not None:
+        config["padding_tokens"] = padding_tokens
+    return config
+
+
+def _linear_params(layer):
+    """fp32 (weight, bias) of a Linear, dequantizing an int8 dynamic one."""
+    weight, bias = layer.weight, layer.bias
+    if callable(weight):  # torch.ao dynamic quantized Linear exposes them as methods
+        weight, bias = weight().dequantize(), bias()
+    return weight.detach().float(), bias.detach().float()
+
+
+def stack_heads(heads, device):
+    """Stack AestheticMLPs into per-layer batched weights for run_stacked_heads.
+
+    The last two Linears (64 -> 16 -> 1) have no activation between them and
+    are folded into one, so H heads take four batched matmuls in total.
+    """
+    layers = []
+    for head in heads:
+        params = [_linear_params(layer) for layer in head.layers if not isinstance(layer, torch.nn.ReLU)]
+        (w4, b4), (w5, b5) = params[-2:]
+        layers.append(params[:-2] + [(w5 @ w4, w5 @ b4 + b5)])
+    stacked = []
+    for i in range(len(layers[0])):
+        weights = torch.stack([head[i][0].t() for head in layers]).to(device)  # (H, in, out)
+        biases = torch.stack([head[i][1] for head in layers]).unsqueeze(1).to(device)  # (H, 1, out)
+        stacked.append((weights, biases))
+    return stacked
+
+
+def run_stacked_heads(stacked, features):
+    """(N, 768) features -> (H, N) raw scores, one row per stacked head."""
+    # (in, out) weight blocks per head measured faster under bmm than one wide
+    # (768, H*1024) matmul or Linear's (out, in) layout across batch sizes
+    hidden = features.expand(len(stacked[0][0]), *features.shape)
+    for i, (weights, biases) in enumerate(stacked):
+        hidden = torch.baddbmm(biases, hidden, weights)
+        if i < len(stacked) - 1:
+            hidden = torch.relu(hidden)
+    return hidden.squeeze(2)
+
+
+class HeadState:
+    """The heads a predictor scores with, shared by reference with its with_fast_mode() variants.
+
+    Holds the predictor's own head (`linear`, DEFAULT_HEAD) with its version
+    and file stat, the registry of extra named heads and their stacked
+    weights, so reload_head() or add_head() on any of the predictors that
+    share it is seen by all of them.
+    """
+
+    def __init__(self, linear, version, stat):
+        self.linear = linear
+        self.version = version
+        self.stat = stat
+        # Extra named heads sharing the backbone (see add_head)
+        self.heads = {}
+        self.stack = None
+        self.lock = threading.Lock()
+
+
 class LAIONAestheticPredictor:
-    def __init__(self, device=None):
+    def __init__(self, device=None, cache=None, precision="fp32", bundle=None, fast_mode=None):
         if device is None:
             device = "cuda" if torch.cuda.is_available() else "cpu"
         self.device = device
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}, got {precision!r}")
+        if precision == "int8" and torch.device(device).type != "cpu":
+            raise ValueError("int8 dynamic quantization is only available on CPU")
+        if precision == "bf16" and not bf16_supported(device):
+            print("bf16 is not supported natively on this device. Falling back to fp32.")
+            precision = "fp32"
+        self.precision = precision
+        # Optional EmbeddingCache; embeddings only depend on the backbone, so they
+        # stay valid when the head weights change
+        self.cache = cache
+        # Set by enable_micro_batching()
+        self.batcher = None
+
+        # A model bundle (see model_bundle.py) replaces the hub download, the base
+        # weight download and the key remapping; it is used automatically if present
+        if bundle is None and os.path.exists(BUNDLE_PATH):
+            bundle = BUNDLE_PATH
+        bundle_backbone = bundle_head = bundle_head_version = None
+        bundle_config = {}
+        if bundle is not None:
+            print(f"Loading model bundle {bundle}.")
+            tensors, metadata = load_bundle(bundle, writable=True)
+            if metadata.get("model_name") != MODEL_NAME:
+                raise ValueError(f"Bundle {bundle} holds {metadata.get('model_name')!r}, expected {MODEL_NAME!r}")
+            bundle_config = json.loads(metadata.get("preprocess_config", "{}"))
+            bundle_backbone, bundle_head = split_bundle(tensors)
+            # Bundles written before the head version was recorded only say "bundle"
+            bundle_head_version = metadata.get("head_version", "bundle")
         
-        # Create and load the MLP
-        self.linear = AestheticMLP()
+        # Create and load the MLP: fine-tuned weights, else the bundled head, else the base download
+        self._bundle_head = bundle_head
+        self._bundle_head_version = bundle_head_version
+        state_dict, version, stat = self._read_head_weights()
+        self._head_state = HeadState(self._build_head(state_dict), version, stat)
+        
+        # Load the ViT model. timm and torchvision are only needed from here on,
+        # so importing this module stays cheap
+        import timm
 
-        # Check for a fine-tuned model first
-        if FINETUNED_WEIGHTS_PATH.exists():
-            print("Loading fine-tuned model weights.")
-            # Load the state dict directly from the fine-tuned file
-            self.linear.load_state_dict(torch.load(FINETUNED_WEIGHTS_PATH, map_location=self.device))
+        if bundle_backbone is not None:
+            self.model = self._backbone_from_state_dict(timm, bundle_backbone)
         else:
-            print("No fine-tuned model found. Loading base model weights.")
-            # Download and load the base aesthetic weights if needed
-            download_weights(AESTHETIC_WEIGHTS_URL, AESTHETIC_WEIGHTS_PATH)
-            base_weights = torch.load(AESTHETIC_WEIGHTS_PATH, map_location=self.device)
-            
-            # Map the keys from the base model to the MLP state dict format
-            state_dict = {}
-            for k, v in base_weights.items():
-                new_key = k.replace('layers.', '') if 'layers.' in k else k
-                state_dict[f'layers.{new_key}'] = v
-            self.linear.load_state_dict(state_dict)
-
-        self.linear.to(self.device)
-        self.linear.eval()
-        
-        # Load the ViT model
-        self.model = timm.create_model(MODEL_NAME, pretrained=True)
+            self.model = timm.create_model(MODEL_NAME, pretrained=True)
         self.model.eval()
         self.model.to(self.device)
-        
+
+        self.model = apply_precision(self.model, self.precision)
+
+        self._native_size = bundle_config.get("size", IMAGE_SIZE)
+        self._normalization = (bundle_config.get("mean", CLIP_MEAN), bundle_config.get("std", CLIP_STD))
+        self._set_fast_mode(fast_mode)
+
+    def _set_fast_mode(self, fast_mode):
+        """Set up preprocessing (and the reduced-token backbone) for `fast_mode`, or the full model for None."""
+        from torchvision import transforms
+
+        self.fast_mode = FastMode(*fast_mode) if fast_mode is not None else None
+        self._reduced = None
+        image_size = self._native_size
+        if self.fast_mode is not None:
+            self._reduced = ReducedTokenViT(self.model, self.fast_mode.resolution, self.fast_mode.padding)
+            image_size = self._reduced.resolution
+
+        mean, std = self._normalization
         self.preprocess = transforms.Compose([
-            ResizeAndPad(224), # Use the new custom transform
+            ResizeAndPad(image_size), # Use the new custom transform
             transforms.ToTensor(),
-            transforms.Normalize(
-                mean=[0.48145466, 0.4578275, 0.40821073],
-                std=[0.26862954, 0.26130258, 0.27577711]
-            )
+            transforms.Normalize(mean=mean, std=std)
         ])
+        # Equivalent single-pass version of `preprocess` used for inference
+        self.fused_preprocess = FusedPreprocessor(image_size, mean, std)
+        # Everything that influences the backbone output; part of the cache key
+        padding_tokens = self.fast_mode.padding if self.fast_mode is not None else None
+        self.preprocess_config = make_preprocess_config(image_size, mean, std, self.precision, padding_tokens)
+
+    def with_fast_mode(self, fast_mode):
+        """A predictor sharing this one's backbone and heads that runs in `fast_mode` (None: full model).
+
+        `fast_mode` is a token_reduction.FastMode(resolution, padding): the input
+        resolution (a multiple of 16; None keeps 224) and whether padding-only
+        patches are kept, dropped or merged into one token. Fewer tokens run
+        faster at some cost in score agreement; compare_fast_modes() measures
+        both. The embedding cache is shared, keyed by mode. The heads are
+        shared, not copied: reload_head() or add_head() on either predictor
+        applies to both.
+        """
+        variant = copy.copy(self)
+        variant.batcher = None
+        variant._set_fast_mode(fast_mode)
+        return variant
+
+    @torch.no_grad()
+    def compare_fast_modes(self, images, modes=(FastMode(None, "drop"), FastMode(None, "merge"), FastMode(160, "merge")),
+                           repeats=3):
+        """Time fast modes against the full model on a reference set of PIL images.
+
+        Must be called on a predictor without a fast mode. Returns a dict keyed
+        by "<resolution>px/<padding>" with `avg_tokens` per image (CLS
+        included), `seconds_per_image`, `speedup` (full model time / mode
+        time) and the mean and max absolute score drift from the full model.
+        """
+        if self.fast_mode is not None:
+            raise ValueError("compare_fast_modes must be called on a predictor without a fast mode")
+        images = list(images)
+        if not images:
+            raise ValueError("compare_fast_modes needs at least one reference image")
+
+        def benchmark(predictor):
+            batch = torch.from_numpy(predictor.fused_preprocess.batch(images).copy())
+            scores = predictor.score_embeddings(predictor._embed_tensor(batch))  # warm-up
+            start = time.perf_counter()
+            for _ in range(repeats):
+                predictor.score_embeddings(predictor._embed_tensor(batch))
+            return batch, scores, (time.perf_counter() - start) / (repeats * len(images))
+
+        _, reference, reference_time = benchmark(self)
+        grid = self._native_size // self.model.patch_embed.patch_size[0]
+        report = {"full": {"avg_tokens": float(1 + grid * grid), "seconds_per_image": reference_time,
+                           "speedup": 1.0, "mean_abs_drift": 0.0, "max_abs_drift": 0.0}}
+        for mode in modes:
+            variant = self.with_fast_mode(mode)
+            variant.cache = None
+            batch, scores, seconds = benchmark(variant)
+            drift = np.abs(scores - reference)
+            tokens = variant._reduced.token_counts(batch, variant.fused_preprocess.fill)
+            report[f"{variant._reduced.resolution}px/{variant.fast_mode.padding}"] = {
+                "avg_tokens": float(tokens.float().mean()),
+                "seconds_per_image": seconds,
+                "speedup": reference_time / seconds,
+                "mean_abs_drift": float(drift.mean()),
+                "max_abs_drift": float(drift.max()),
+            }
+        return report
+
+    @staticmethod
+    def _finetuned_stat():
+        """(mtime_ns, size) of the fine-tuned weights file, or None if there is none."""
+        try:
+            stat = FINETUNED_WEIGHTS_PATH.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_head_weights(self):
+        """Return (state_dict, version, file stat) for the head source currently in effect.
+
+        The fine-tuned file is read into memory once, so the version hash and
+        the loaded weights always describe the same bytes.
+        """
+        stat = self._finetuned_stat()
+        if stat is not None:
+            print("Loading fine-tuned model weights.")
+            data = FINETUNED_WEIGHTS_PATH.read_bytes()
+            version = "finetuned-" + hashlib.sha256(data).hexdigest()[:12]
+            return torch.load(io.BytesIO(data), map_location=self.device), version, stat
+        if self._bundle_head is not None:
+            state_dict = {k: torch.from_numpy(v) for k, v in self._bundle_head.items()}
+            return state_dict, self._bundle_head_version, None
+
+        print("No fine-tuned model found. Loading base model weights.")
+        state_dict, version = load_base_head(self.device)
+        return state_dict, version, None
+
+    def _build_head(self, state_dict):
+        head = AestheticMLP()
+        head.load_state_dict(state_dict)
+        head.to(self.device)
+        head.eval()
+        return apply_precision(head, self.precision)
+
+    @property
+    def linear(self):
+        return self._head_state.linear
+
+    @linear.setter
+    def linear(self, head):
+        self._head_state.linear = head
+
+    @property
+    def head_version(self):
+        return self._head_state.version
+
+    @property
+    def heads(self):
+        return self._head_state.heads
+
+    def reload_head(self, force=False):
+        """Swap in the fine-tuned head if its file changed since it was loaded; True if swapped.
+
+        Cheap enough to call on every request: unless the file's mtime or size
+        changed (or it appeared or disappeared), this is a single stat(). The
+        new head (~1 MB) is built off to the side and then replaces `linear`
+        in one assignment, so a batch already scoring keeps the head it
+        started with and the backbone is never touched. Rewriting identical
+        weights does not count as a change.
+        """
+        state = self._head_state
+        if not force and self._finetuned_stat() == state.stat:
+            return False
+        with state.lock:
+            # Another thread may have reloaded while this one waited for the lock
+            if not force and self._finetuned_stat() == state.stat:
+                return False
+            state_dict, version, stat = self._read_head_weights()
+            state.stat = stat
+            if version == state.version and not force:
+                return False
+            state.linear = self._build_head(state_dict)
+            state.version = version
+        print(f"Head weights reloaded ({version}).")
+        return True
+
+    @staticmethod
+    def _backbone_from_state_dict(timm, state_dict):
+        """Build the ViT around memory-mapped bundle tensors without copying them."""
+        state_dict = {k: torch.from_numpy(v) for k, v in state_dict.items()}
+        try:
+            # Skeleton on the meta device: no random init, parameters become the mapped tensors
+            with torch.device("meta"):
+                model = timm.create_model(MODEL_NAME, pretrained=False)
+            model.load_state_dict(state_dict, assign=True)
+            if not any(t.is_meta for t in list(model.parameters()) + list(model.buffers())):
+                return model
+        except (TypeError, AttributeError, RuntimeError):
+            # torch < 2.1 has no meta device context or assign=True
+            pass
+        model = timm.create_model(MODEL_NAME, pretrained=False)
+        model.load_state_dict(state_dict)
+        return model
+
+    def _autocast(self):
+        if self.precision == "bf16":
+            return torch.autocast(device_type=torch.device(self.device).type, dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    @torch.no_grad()
+    def compare_precisions(self, images, precisions=("int8", "bf16"), repeats=3):
+        """Time reduced-precision modes against fp32 on a reference set of PIL images.
+
+        Must be called on an fp32 predictor. Returns a dict keyed by precision with
+        `seconds_per_image`, `speedup` (fp32 time / mode time) and the mean and max
+        absolute score drift from fp32. Modes the device cannot run are reported
+        with `available: False`.
+        """
+        if self.precision != "fp32":
+            raise ValueError("compare_precisions must be called on an fp32 predictor")
+        images = list(images)
+        if not images:
+            raise ValueError("compare_precisions needs at least one reference image")
+        batch = torch.from_numpy(self.fused_preprocess.batch(images).copy())
+
+        def benchmark(predictor):
+            scores = predictor.score_embeddings(predictor._embed_tensor(batch))  # warm-up
+            start = time.perf_counter()
+            for _ in range(repeats):
+                predictor.score_embeddings(predictor._embed_tensor(batch))
+            return scores, (time.perf_counter() - start) / (repeats * len(images))
+
+        reference, reference_time = benchmark(self)
+        report = {"fp32": {"available": True, "seconds_per_image": reference_time, "speedup": 1.0,
+                           "mean_abs_drift": 0.0, "max_abs_drift": 0.0}}
+        for precision in precisions:
+            if precision not in PRECISIONS:
+                raise ValueError(f"precision must be one of {PRECISIONS}, got {precision!r}")
+            if precision == "fp32":
+                continue
+            available = (torch.device(self.device).type == "cpu") if precision == "int8" else bf16_supported(self.device)
+            if not available:
+                report[precision] = {"available": False}
+                continue
+
+            # Shallow copy sharing the preprocessing; only the modules and precision differ
+            variant = copy.copy(self)
+            variant.cache = None
+            variant.batcher = None
+            variant.precision = precision
+            variant.model = apply_precision(self.model, precision)
+            # Its own head state, so the quantized head never replaces this predictor's
+            variant._head_state = HeadState(apply_precision(self.linear, precision), self.head_version, None)
+            if self.fast_mode is not None:
+                variant._set_fast_mode(self.fast_mode)  # Rebuild around the variant's backbone
+
+            scores, seconds = benchmark(variant)
+            drift = np.abs(scores - reference)
+            report[precision] = {
+                "available": True,
+                "seconds_per_image": seconds,
+                "speedup": reference_time / seconds,
+                "mean_abs_drift": float(drift.mean()),
+                "max_abs_drift": float(drift.max()),
+            }
+        return report
+
+    def enable_micro_batching(self, max_batch_size=16, max_wait_ms=5, num_threads=None):
+        """Batch concurrent predict() calls (e.g. from Streamlit sessions) on one worker thread.
+
+        predict_bytes(), predict_batch() and embed_batch() go through it too.
+        Callers still decode and resize their own images and check the cache;
+        only the backbone pass is shared. `num_threads` caps torch's intra-op threads so
+        the single batch in flight does not oversubscribe the CPU.
+        """
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+        if self.batcher is not None:
+            self.batcher.close()
+        self.batcher = MicroBatcher(self._embed_pixels, max_batch_size, max_wait_ms)
 
     @torch.no_grad()
     def predict(self, pil_image):
         if not isinstance(pil_image, Image.Image):
             raise ValueError("Input must be a PIL.Image.Image")
-        image = self.preprocess(pil_image).unsqueeze(0).to(self.device)
-        features = self.model.forward_features(image)
-        features = features[:, 0, :]  # CLS token
-        score = self.linear(features).item()
+        return float(self.predict_batch([pil_image])[0])
+
+    @torch.no_grad()
+    def _features(self, pil_image):
+        """CLS embedding of one image, via the cache and (if enabled) the micro-batcher."""
+        if not isinstance(pil_image, Image.Image):
+            raise ValueError("Input must be a PIL.Image.Image")
+        return self.embed_batch([pil_image])[0]
+
+    @torch.no_grad()
+    def predict_bytes(self, data):
+        """Score an encoded image. With a cache, a repeat upload is never decoded."""
+        key = embedding_key(data, self.preprocess_config) if self.cache is not None else None
+        features = self.cache.get(key) if key is not None else None
+        if features is None:
+            pil_image = open_image(data, min_size=self.preprocess_config["draft_min_size"])
+            features = self._embed_images([pil_image])[0]
+            if key is not None:
+                self.cache.put(key, features)
+        return float(self.score_embeddings(features[None, :])[0])
+
+    @torch.no_grad()
+    def predict_batch(self, images, batch_size=32):
+        """Score an iterable of PIL images, running the ViT once per chunk of `batch_size`."""
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        scores = []
+        chunk = []
+        for pil_image in images:
+            if not isinstance(pil_image, Image.Image):
+                raise ValueError("Input must be a PIL.Image.Image")
+            chunk.append(pil_image)
+            if len(chunk) == batch_size:
+                scores.append(self.score_embeddings(self.embed_batch(chunk)))
+                chunk = []
+        if chunk:
+            scores.append(self.score_embeddings(self.embed_batch(chunk)))
+        if not scores:
+            return np.empty(0, dtype=np.float32)
+        return np.concatenate(scores)
+
+    @torch.no_grad()
+    def embed_stream(self, sources, batch_size=32, workers=None, prefetch=2, use_processes=False):
+        """Embed file paths or byte blobs, decoding on a worker pool while the model runs.
+
+        Yields (indices, features, failures) per batch, where `indices` are input
+        positions, `features` the matching (n, 768) CLS embeddings and `failures`
+        a list of (index, error message) for inputs that could not be decoded.
+        """
+        pipeline = PrefetchPipeline(
+            self.fused_preprocess,
+            batch_size=batch_size,
+            workers=workers,
+            prefetch=prefetch,
+            use_processes=use_processes,
+            min_size=self.preprocess_config["draft_min_size"],
+        )
+        for batch in pipeline.batches(sources):
+            if batch.indices:
+                features = self._embed_tensor(torch.from_numpy(batch.pixels))
+            else:
+                features = np.empty((0, self.linear.layers[0].in_features), dtype=np.float32)
+            yield batch.indices, features, batch.failures
+
+    def predict_stream(self, sources, batch_size=32, workers=None, prefetch=2, use_processes=False):
+        """Score file paths or byte blobs with a prefetching worker pool.
+
+        Yields (index, score, error) for every input, batch by batch; `score` is
+        None and `error` a message when the input could not be decoded.
+        """
+        for indices, features, failures in self.embed_stream(sources, batch_size, workers, prefetch, use_processes):
+            for index, error in failures:
+                yield index, None, error
+            if indices:
+                for index, score in zip(indices, self.score_embeddings(features)):
+                    yield index, float(score), None
+
+    def image_key(self, pil_image):
+        """Cache key for a decoded image: its pixel bytes plus the preprocessing config."""
+        header = f"{pil_image.mode}:{pil_image.width}x{pil_image.height}:".encode("ascii")
+        return embedding_key(header + pil_image.tobytes(), self.preprocess_config)
+
+    @torch.no_grad()
+    def embed_batch(self, images):
+        """Return the (N, 768) CLS embeddings for a list of PIL images, using the cache if set."""
+        if self.cache is None:
+            return self._embed_images(images)
+
+        keys = [self.image_key(img) for img in images]
+        features = [self.cache.get(key) for key in keys]
+        missing = [i for i, f in enumerate(features) if f is None]
+        if missing:
+            for i, f in zip(missing, self._embed_images([images[i] for i in missing])):
+                self.cache.put(keys[i], f)
+                features[i] = f
+        return np.stack(features)
+
+    @torch.no_grad()
+    def _embed_images(self, images):
+        """Backbone pass for a list of PIL images, shared through the micro-batcher when enabled."""
+        if self.batcher is None:
+            return self._embed_tensor(torch.from_numpy(self.fused_preprocess.batch(images)))
+        # Submit every image before waiting, so they can share batches with other callers
+        futures = [self.batcher.submit(self.fused_preprocess.resize_array(img)) for img in images]
+        return np.stack([future.result() for future in futures])
+
+    @torch.no_grad()
+    def score_embeddings(self, features):
+        """Run only the head on precomputed CLS embeddings and return clamped scores."""
+        # One read of the head per batch: a concurrent reload_head() can't mix two heads in it
+        head = self.linear
+        features = torch.tensor(np.asarray(features, dtype=np.float32), device=self.device)
+        with self._autocast():
+            scores = head(features).squeeze(1)
         # Clamp to [0, 10]
-        return max(0, min(10, score)) 
\ No newline at end of file
+        return scores.clamp(0, 10).float().cpu().numpy()
+
+    def add_head(self, name, weights):
+        """Register a named head that shares this predictor's backbone.
+
+        `weights` is a path to a head checkpoint (fine-tuned or base format),
+        a state dict or an AestheticMLP. Replaces any head of the same name.
+        """
+        if name == DEFAULT_HEAD:
+            raise ValueError(f"{DEFAULT_HEAD!r} is the predictor's own head; use reload_head() to change it")
+        if isinstance(weights, torch.nn.Module):
+            weights = weights.state_dict()
+        elif not isinstance(weights, dict):
+            weights = torch.load(weights, map_location="cpu")
+        head = AestheticMLP()
+        head.load_state_dict(head_state_dict(weights))
+        head.eval()
+        state = self._head_state
+        state.heads = {**state.heads, name: head}
+
+    def remove_head(self, name):
+        state = self._head_state
+        state.heads = {k: v for k, v in state.heads.items() if k != name}
+
+    def _stacked_heads(self):
+        """(names, stacked weights) for the default head plus the registry, rebuilt when either changes."""
+        # Read each attribute once: a concurrent add_head() or reload_head() only affects later calls
+        state = self._head_state
+        heads = state.heads
+        modules = [state.linear, *heads.values()]
+        names = [DEFAULT_HEAD, *heads]
+        cached = state.stack
+        if (cached is not None and cached[1] == names and len(cached[0]) == len(modules)
+                and all(a is b for a, b in zip(cached[0], modules))):
+            return names, cached[2]
+        stacked = stack_heads(modules, self.device)
+        state.stack = (modules, names, stacked)
+        return names, stacked
+
+    @torch.no_grad()
+    def score_heads(self, features):
+        """Scores of every head for precomputed CLS embeddings, as {name: (N,) array}.
+
+        All heads run together as stacked batched matmuls in fp32 (bf16 under
+        bf16 autocast); int8 heads are dequantized for this.
+        """
+        names, stacked = self._stacked_heads()
+        features = torch.tensor(np.asarray(features, dtype=np.float32), device=self.device)
+        with self._autocast():
+            scores = run_stacked_heads(stacked, features)
+        scores = scores.clamp(0, 10).float().cpu().numpy()
+        return dict(zip(names, scores))
+
+    @torch.no_grad()
+    def predict_heads(self, pil_image):
+        """Score one PIL image with every registered head from a single backbone pass: {name: score}."""
+        features = self._features(pil_image)
+        return {name: float(scores[0]) for name, scores in self.score_heads(features[None, :]).items()}
+
+    @torch.no_grad()
+    def _embed_pixels(self, pixels):
+        # Runs on the micro-batcher thread with resized uint8 images from several callers
+        batch = self.fused_preprocess.batch_buffer(len(pixels))
+        for out, image_pixels in zip(batch, pixels):
+            self.fused_preprocess.write(image_pixels, out)
+        return self._embed_tensor(torch.from_numpy(batch))
+
+    @torch.no_grad()
+    def _embed_tensor(self, batch):
+        batch = batch.to(self.device)
+        with self._autocast():
+            if self._reduced is not None:
+                features = self._reduced(batch, self.fused_preprocess.fill)
+            else:
+                features = self.model.forward_features(batch)[:, 0, :]  # CLS token
+        return features.float().cpu().numpy()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Merge the output parts of score.py (sharded or not) into one file.
+
+Every checkpoint in the directory must be complete and, for sharded runs,
+all N shards must be present. Rows are deduplicated by image id, preferring
+a successful score over a decode error. With --input, the merged ids are
+checked against the original input so nothing is silently missing:
+
+    python src/merge_scores.py scores/ --output scores.csv --input photos/
+    python src/merge_scores.py scores/ --output scores.parquet
+"""
+
+import os
+import sys
+import csv
+import glob
+import json
+import argparse
+
+from score import COLUMNS, iter_inputs, write_part
+
+
+def read_part(path):
+    """Return the rows of one part as [image_id, path, score, error] lists."""
+    if path.endswith(".parquet"):
+        import pandas as pd
+
+        frame = pd.read_parquet(path).astype(object)
+        frame = frame.where(frame.notna(), None)
+        return frame[COLUMNS].values.tolist()
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [[image_id, image_path, float(score) if score else None, error or None]
+                for image_id, image_path, score, error in reader]
+
+
+def check_checkpoints(scores_dir):
+    """Validate the run's checkpoints; returns (output format, total inputs recorded)."""
+    checkpoints = []
+    for path in sorted(glob.glob(os.path.join(scores_dir, "_checkpoint*.json"))):
+        with open(path) as f:
+            checkpoints.append((os.path.basename(path), json.load(f)))
+    if not checkpoints:
+        raise SystemExit(f"❌ No checkpoints in {scores_dir}")
+
+    problems = [f"{name} is not complete ({c['items_done']} images so far)" for name, c in checkpoints if not c["done"]]
+    formats = {c["settings"]["format"] for _, c in checkpoints}
+    if len(formats) > 1:
+        problems.append(f"Parts were written in mixed formats: {sorted(formats)}")
+
+    shards = [c["settings"].get("shard") for _, c in checkpoints]
+    if any(shards):
+        if not all(shards):
+            problems.append("Sharded and unsharded runs share this directory")
+        else:
+            counts = {int(shard.split("/")[1]) for shard in shards}
+            if len(counts) > 1:
+                problems.append(f"Shards from runs with different N: {sorted(counts)}")
+            else:
+                (count,) = counts
+                missing = sorted(set(range(count)) - {int(shard.split("/")[0]) for shard in shards})
+                if missing:
+                    problems.append(f"Missing shards {missing} of {count}")
+
+    if problems:
+        raise SystemExit("❌ Cannot merge:\n" + "\n".join(f"- {problem}" for problem in problems))
+    return formats.pop(), sum(c["items_done"] for _, c in checkpoints)
+
+
+def merge(parts):
+    """Deduplicate rows by image id; returns ({image_id: row}, duplicates, conflicting scores)."""
+    merged = {}
+    duplicates = conflicts = 0
+    for part in parts:
+        for row in read_part(part):
+            previous = merged.get(row[0])
+            if previous is None:
+                merged[row[0]] = row
+                continue
+            duplicates += 1
+            if previous[2] is None and row[2] is not None:
+                merged[row[0]] = row
+            elif previous[2] is not None and row[2] is not None and abs(previous[2] - row[2]) > 1e-4:
+                conflicts += 1
+    return merged, duplicates, conflicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge, dedupe and validate score.py output parts")
+    parser.add_argument("scores_dir", help="The --output directory of score.py")
+    parser.add_argument("--output", required=True, help="Merged file (.csv or .parquet)")
+    parser.add_argument("--input", default=None,
+                        help="The original score.py input, to validate that every image was scored")
+    parser.add_argument("--allow-missing", action="store_true", help="Write the merged file even if coverage is incomplete")
+    args = parser.parse_args()
+
+    fmt, recorded = check_checkpoints(args.scores_dir)
+    parts = sorted(glob.glob(os.path.join(args.scores_dir, f"*part-*.{fmt}")))
+    merged, duplicates, conflicts = merge(parts)
+    print(f"Read {len(parts)} parts: {len(merged)} images, {duplicates} duplicates dropped, "
+          f"{conflicts} with conflicting scores")
+
+    if args.input is not None:
+        expected = [image_id for image_id, _ in iter_inputs(args.input)]
+        missing = [image_id for image_id in expected if image_id not in merged]
+        extra = len(merged) - (len(expected) - len(missing))
+        rows = [merged[image_id] for image_id in expected if image_id in merged]
+    else:
+        # Without the input, check that the parts hold as many rows as the checkpoints recorded
+        missing = [None] * max(0, recorded - len(merged) - duplicates)
+        extra = 0
+        rows = [merged[image_id] for image_id in sorted(merged)]
+
+    failed = sum(1 for row in rows if row[2] is None)
+    if extra:
+        print(f"⚠️ {extra} scored images are not in the input")
+    if missing:
+        named = [image_id for image_id in missing[:10] if image_id is not None]
+        print(f"❌ {len(missing)} images were not scored" + (f", e.g. {named}" if named else ""))
+        if not args.allow_missing:
+            return 1
+
+    write_part(rows, args.output, os.path.splitext(args.output)[1].lstrip(".") or "csv")
+    print(f"✅ Wrote {len(rows)} scores ({failed} failed to decode) to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
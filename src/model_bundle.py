@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Single-file model bundle: ViT backbone, MLP head and preprocessing config in
+the safetensors layout (8-byte little-endian header length, JSON header,
+raw tensor bytes). Reading needs only NumPy and memory-maps the file, so
+tensors are never copied or remapped at startup.
+
+Build it once (the only step that needs the network):
+
+    python src/model_bundle.py --output models/aesthetic_bundle.safetensors
+    python src/model_bundle.py --head-only   # models/aesthetic_head.safetensors
+"""
+
+import os
+import sys
+import json
+import struct
+import argparse
+
+import numpy as np
+
+BUNDLE_PATH = os.path.join("models", "aesthetic_bundle.safetensors")
+BUNDLE_FORMAT = "aesthetic-bundle"
+BUNDLE_VERSION = "1"
+
+# safetensors dtype names
+_DTYPES = {
+    "F32": np.float32,
+    "F16": np.float16,
+    "F64": np.float64,
+    "I64": np.int64,
+    "I32": np.int32,
+    "U8": np.uint8,
+}
+_DTYPE_NAMES = {np.dtype(dtype): name for name, dtype in _DTYPES.items()}
+
+
+def save_bundle(tensors, path, metadata=None):
+    """Write a dict of NumPy arrays (and string metadata) to `path` atomically."""
+    header = {}
+    offset = 0
+    arrays = []
+    for name, array in tensors.items():
+        array = np.ascontiguousarray(array)
+        if array.dtype not in _DTYPE_NAMES:
+            raise ValueError(f"Unsupported dtype {array.dtype} for tensor {name}")
+        header[name] = {
+            "dtype": _DTYPE_NAMES[array.dtype],
+            "shape": list(array.shape),
+            "data_offsets": [offset, offset + array.nbytes],
+        }
+        offset += array.nbytes
+        arrays.append(array)
+    if metadata:
+        header["__metadata__"] = {key: str(value) for key, value in metadata.items()}
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    # Pad with spaces so the tensor data starts 8-byte aligned
+    header_bytes += b" " * (-len(header_bytes) % 8)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for array in arrays:
+            f.write(array.reshape(-1).view(np.uint8))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_bundle(path, writable=False):
+    """Memory-map a bundle and return ({name: array}, metadata).
+
+    Arrays are views into one mapping of the file. With `writable`, the mapping
+    is copy-on-write, which torch.from_numpy needs; the file itself is never
+    modified and pages are only copied if a tensor is written to.
+    """
+    with open(path, "rb") as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size))
+    metadata = header.pop("__metadata__", {})
+
+    data_start = 8 + header_size
+    file_size = os.path.getsize(path)
+    if file_size == data_start:
+        return {name: np.empty(info["shape"], dtype=_DTYPES[info["dtype"]]) for name, info in header.items()}, metadata
+    buffer = np.memmap(path, dtype=np.uint8, mode="c" if writable else "r", offset=data_start,
+                       shape=(file_size - data_start,))
+
+    tensors = {}
+    for name, info in header.items():
+        begin, end = info["data_offsets"]
+        dtype = _DTYPES[info["dtype"]]
+        tensors[name] = buffer[begin:end].view(dtype).reshape(info["shape"])
+    return tensors, metadata
+
+
+def split_bundle(tensors):
+    """Split bundle tensors into (backbone, head) state dicts without the name prefixes."""
+    backbone = {name[len("backbone."):]: t for name, t in tensors.items() if name.startswith("backbone.")}
+    head = {name[len("head."):]: t for name, t in tensors.items() if name.startswith("head.")}
+    return backbone, head
+
+
+def build_bundle(backbone, head, preprocess_config, path=BUNDLE_PATH, head_version=None):
+    """Write a backbone module, a head state dict and the preprocessing config to `path`.
+
+    `head_version` is recorded in the metadata and becomes the predictor's
+    head_version when the bundled head is in use.
+    """
+    tensors = {}
+    for prefix, state_dict in (("backbone.", backbone.state_dict()), ("head.", head)):
+        for name, tensor in state_dict.items():
+            tensors[prefix + name] = tensor.detach().cpu().float().numpy()
+    metadata = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "model_name": preprocess_config["model"],
+        "preprocess_config": json.dumps(preprocess_config),
+    }
+    if head_version is not None:
+        metadata["head_version"] = head_version
+    save_bundle(tensors, path, metadata)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a single-file model bundle for offline, instant startup")
+    parser.add_argument("--output", default=None, help=f"Defaults to {BUNDLE_PATH} (or the head file with --head-only)")
+    parser.add_argument("--head-only", action="store_true",
+                        help="Only write the MLP head, for NumpyAestheticHead in torch-free deployments")
+    args = parser.parse_args()
+
+    from laion_aesthetic_predictor import MODEL_NAME, load_base_head, make_preprocess_config
+    from preprocessing import IMAGE_SIZE, CLIP_MEAN, CLIP_STD
+
+    # Always the published weights: a predictor could pick up a fine-tuned head
+    # or the backbone of an older bundle
+    head, head_version = load_base_head()
+    if args.head_only:
+        from numpy_head import HEAD_PATH, save_head
+
+        args.output = save_head(head, args.output or HEAD_PATH)
+    else:
+        import timm
+
+        backbone = timm.create_model(MODEL_NAME, pretrained=True).eval()
+        config = make_preprocess_config(IMAGE_SIZE, CLIP_MEAN, CLIP_STD, "fp32")
+        args.output = build_bundle(backbone, head, config, args.output or BUNDLE_PATH, head_version)
+    print(f"Saved model bundle to {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+
+from model_bundle import BUNDLE_PATH, load_bundle, save_bundle, split_bundle
+
+# Head-only weights in the bundle format, readable without torch
+HEAD_PATH = os.path.join("models", "aesthetic_head.safetensors")
+
+# Linear layers of AestheticMLP.layers, by Sequential index. ReLU follows the
+# first three; the last two have nothing between them and fold into one.
+_RELU_LAYERS = (0, 2, 4)
+_TAIL_LAYERS = (6, 7)
+
+
+class NumpyAestheticHead:
+    """AestheticMLP inference in plain NumPy for precomputed CLS embeddings.
+
+    The 64->16->1 tail is folded into a single 64->1 layer (W = W7 @ W6,
+    b = W7 @ b6 + b7), and embeddings are scored in row blocks with
+    preallocated float32 buffers, so a memory-mapped FeatureStore matrix can be
+    streamed through without loading it whole.
+    """
+
+    def __init__(self, state_dict, block_size=4096):
+        def weight(i):
+            return np.asarray(state_dict[f"layers.{i}.weight"], dtype=np.float32)
+
+        def bias(i):
+            return np.asarray(state_dict[f"layers.{i}.bias"], dtype=np.float32)
+
+        # Stored as (in, out) so a block is `x @ W + b`
+        self.layers = [(np.ascontiguousarray(weight(i).T), bias(i)) for i in _RELU_LAYERS]
+        w6, w7 = weight(_TAIL_LAYERS[0]), weight(_TAIL_LAYERS[1])
+        tail_weight = (w7 @ w6).T
+        tail_bias = w7 @ bias(_TAIL_LAYERS[0]) + bias(_TAIL_LAYERS[1])
+        self.tail = (np.ascontiguousarray(tail_weight, dtype=np.float32), tail_bias.astype(np.float32))
+        self.input_dim = self.layers[0][0].shape[0]
+        self.block_size = block_size
+
+    @classmethod
+    def load(cls, path=None, **kwargs):
+        """Load head weights from a head file or model bundle (HEAD_PATH, then BUNDLE_PATH by default)."""
+        if path is None:
+            path = HEAD_PATH if os.path.exists(HEAD_PATH) else BUNDLE_PATH
+        tensors, _ = load_bundle(path)
+        _, head = split_bundle(tensors)
+        if not head:
+            raise ValueError(f"No head weights in {path}")
+        return cls(head, **kwargs)
+
+    def __call__(self, features):
+        """Score (N, 768) embeddings; returns (N,) float32 scores clamped to [0, 10]."""
+        features = np.asarray(features)
+        if features.ndim != 2 or features.shape[1] != self.input_dim:
+            raise ValueError(f"Expected features of shape (n, {self.input_dim}), got {features.shape}")
+        n = len(features)
+        scores = np.empty(n, dtype=np.float32)
+        block = min(self.block_size, n) or 1
+        buffers = [np.empty((block, weight.shape[1]), dtype=np.float32) for weight, _ in self.layers]
+
+        for start in range(0, n, block):
+            x = np.asarray(features[start:start + block], dtype=np.float32)
+            rows = len(x)
+            for (weight, bias), buffer in zip(self.layers, buffers):
+                out = buffer[:rows]
+                np.matmul(x, weight, out=out)
+                out += bias
+                np.maximum(out, 0, out=out)
+                x = out
+            weight, bias = self.tail
+            scores[start:start + rows] = (x @ weight)[:, 0] + bias[0]
+        return np.clip(scores, 0, 10, out=scores)
+
+
+def save_head(state_dict, path=HEAD_PATH):
+    """Write AestheticMLP weights (tensors or NumPy arrays) as a head-only file for NumpyAestheticHead."""
+    tensors = {}
+    for name, t in state_dict.items():
+        if hasattr(t, "detach"):
+            t = t.detach().cpu().numpy()
+        tensors[f"head.{name}"] = np.asarray(t, dtype=np.float32)
+    save_bundle(tensors, path, {"format": "aesthetic-head", "version": "1"})
+    return path
+
+
+class TorchFreePredictor:
+    """Exported ONNX backbone (embeddings only) + NumpyAestheticHead: a real model score without torch."""
+
+    def __init__(self, onnx_path=None, head_path=None):
+        from exported_predictor import EXPORT_DIR, EXPORT_BASENAME, ExportedAestheticPredictor
+
+        onnx_path = onnx_path or os.path.join(EXPORT_DIR, EXPORT_BASENAME + ".onnx")
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"No exported graph at {onnx_path}")
+        self.head = NumpyAestheticHead.load(head_path)
+        self.backbone = ExportedAestheticPredictor(onnx_path)
+
+    def predict(self, pil_image):
+        return float(self.head(self.backbone.embed_batch([pil_image]))[0])
+
+    def predict_batch(self, images, batch_size=32):
+        return self.head(self.backbone.embed_batch(images, batch_size))
+
+
+def load_torch_free_predictor(onnx_path=None, head_path=None):
+    """TorchFreePredictor if onnxruntime, the exported graph and head weights are all present, else None."""
+    try:
+        return TorchFreePredictor(onnx_path, head_path)
+    except Exception as e:
+        # Besides missing packages or files, onnxruntime raises its own exception
+        # types for a corrupt or incompatible graph; none of them should take the app down
+        print(f"Model scorer not available ({type(e).__name__}: {e}); using image metrics only.")
+        return None
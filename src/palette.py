@@ -0,0 +1,117 @@
+import numpy as np
+
+# Bits kept per channel when binning colours: 4 -> a 16x16x16 histogram. Bin
+# colours are pixel means, so coarse bins cost little accuracy and keep the
+# clustering to at most 4096 points
+PALETTE_BITS = 4
+PALETTE_METHODS = ("kmeans", "median_cut")
+
+
+def color_histogram(pixels, bits=PALETTE_BITS):
+    """Bin uint8 RGB pixels into a 3-D histogram.
+
+    Returns (colors, counts) for the occupied bins only, where `colors` is the
+    (M, 3) float32 mean of the actual pixels in each bin (not the bin centre)
+    and `counts` the (M,) pixel counts.
+    """
+    pixels = np.asarray(pixels).reshape(-1, 3)
+    if pixels.dtype != np.uint8:
+        raise ValueError(f"Expected uint8 pixels, got {pixels.dtype}")
+    shift = 8 - bits
+    index = (pixels[:, 0] >> shift).astype(np.intp) << (2 * bits)
+    index |= (pixels[:, 1] >> shift).astype(np.intp) << bits
+    index |= pixels[:, 2] >> shift
+
+    size = 1 << (3 * bits)
+    counts = np.bincount(index, minlength=size)
+    occupied = np.flatnonzero(counts)
+    sums = np.stack([np.bincount(index, weights=pixels[:, c], minlength=size)[occupied] for c in range(3)], axis=1)
+    counts = counts[occupied]
+    return (sums / counts[:, None]).astype(np.float32), counts
+
+
+def _median_cut(colors, counts, num_colors):
+    """Split the weighted colours into up to `num_colors` boxes; returns a label per colour."""
+
+    def box(members):
+        spread = colors[members].max(axis=0) - colors[members].min(axis=0)
+        # Priority: pixels in the box times its widest channel range
+        return members, spread, int(counts[members].sum()) * float(spread.max())
+
+    boxes = [box(np.arange(len(colors)))]
+    while len(boxes) < num_colors:
+        i = max(range(len(boxes)), key=lambda j: boxes[j][2])
+        members, spread, priority = boxes[i]
+        if priority == 0:
+            break
+        boxes.pop(i)
+        order = members[np.argsort(colors[members, spread.argmax()], kind="stable")]
+        # Cut at the weighted median, keeping at least one colour on each side
+        cumulative = np.cumsum(counts[order])
+        cut = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+        cut = min(max(cut, 1), len(order) - 1)
+        boxes += [box(order[:cut]), box(order[cut:])]
+
+    labels = np.empty(len(colors), dtype=np.intp)
+    for label, (members, _, _) in enumerate(boxes):
+        labels[members] = label
+    return labels
+
+
+def _weighted_means(colors, counts, labels, k):
+    weights = np.bincount(labels, weights=counts, minlength=k)
+    sums = np.stack([np.bincount(labels, weights=counts * colors[:, c], minlength=k) for c in range(3)], axis=1)
+    return sums / np.maximum(weights, 1)[:, None], weights
+
+
+def _nearest(colors, centers):
+    """Index of the nearest center for each colour (squared distance, expanded into one matmul)."""
+    centers = centers.astype(np.float32)
+    distances = (centers * centers).sum(axis=1) - 2 * colors @ centers.T
+    return distances.argmin(axis=1)
+
+
+def _kmeans(colors, counts, labels, iterations=10):
+    """Weighted Lloyd iterations over the occupied bins, started from `labels`."""
+    k = labels.max() + 1
+    for _ in range(iterations):
+        centers, weights = _weighted_means(colors, counts, labels, k)
+        centers = centers[weights > 0]
+        new_labels = _nearest(colors, centers)
+        if np.array_equal(new_labels, labels):
+            break
+        labels, k = new_labels, len(centers)
+    return labels
+
+
+def extract_palette(pixels, num_colors=5, method="kmeans", bits=PALETTE_BITS):
+    """Dominant colours of a uint8 RGB image or pixel array.
+
+    Pixels are binned with `color_histogram`, then the occupied bins are
+    clustered by weighted median cut, refined with weighted k-means unless
+    `method="median_cut"`. Each cluster is reported as the bin colour closest
+    to its weighted mean; bin colours are averages of real pixels within one
+    bin, so no colour is made up from unrelated channels.
+
+    Returns (colors, percentages): an (n, 3) uint8 array and the share of
+    pixels in each cluster, largest first, with n <= num_colors.
+    """
+    if method not in PALETTE_METHODS:
+        raise ValueError(f"method must be one of {PALETTE_METHODS}, got {method!r}")
+    colors, counts = color_histogram(pixels, bits)
+    if len(colors) == 0:
+        return np.empty((0, 3), dtype=np.uint8), np.empty(0)
+
+    labels = _median_cut(colors, counts, num_colors)
+    if method == "kmeans":
+        labels = _kmeans(colors, counts, labels)
+
+    centers, weights = _weighted_means(colors, counts, labels, labels.max() + 1)
+    order = np.argsort(-weights, kind="stable")
+    order = order[weights[order] > 0]
+    palette = np.empty((len(order), 3), dtype=np.uint8)
+    for i, label in enumerate(order):
+        members = np.flatnonzero(labels == label)
+        nearest = members[((colors[members] - centers[label]) ** 2).sum(axis=1).argmin()]
+        palette[i] = np.rint(colors[nearest])
+    return palette, weights[order] / counts.sum() * 100
@@ -0,0 +1,136 @@
+import os
+import queue
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from preprocessing import IMAGE_SIZE, ResizeAndPad, open_image
+
+# `indices` are positions in the input; `pixels[k]` is the preprocessed image for
+# indices[k]; `failures` lists (index, error message) for inputs that could not be decoded
+PrefetchBatch = namedtuple("PrefetchBatch", ["indices", "pixels", "failures"])
+
+_DONE = object()
+
+
+def load_resized(source, output_size=IMAGE_SIZE, min_size=IMAGE_SIZE * 2, reducing_gap=2.0):
+    """Decode a path or byte blob and return its resized, unpadded uint8 (H, W, 3) pixels.
+
+    Runs on the worker pool, so it only takes picklable arguments.
+    """
+    img = open_image(source, min_size=min_size)
+    img = ResizeAndPad(output_size, reducing_gap=reducing_gap).resize(img)
+    return np.asarray(img)
+
+
+class PrefetchPipeline:
+    """Decode and preprocess images on a worker pool ahead of the model.
+
+    Workers decode and resize; a producer thread normalizes the results into
+    batches (see FusedPreprocessor.write) and hands them to the consumer
+    through a queue bounded at `prefetch` batches, so decoding overlaps the
+    forward pass without reading the whole input ahead.
+    """
+
+    def __init__(self, preprocessor, batch_size=32, workers=None, prefetch=2, use_processes=False,
+                 min_size=IMAGE_SIZE * 2):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if prefetch < 1:
+            raise ValueError("prefetch must be at least 1")
+        self.preprocessor = preprocessor
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.prefetch = prefetch
+        self.use_processes = use_processes
+        self.min_size = min_size
+
+    def _executor(self):
+        if self.use_processes:
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+
+    def batches(self, sources):
+        """Yield PrefetchBatch tuples for an iterable of file paths or byte blobs, in input order.
+
+        Each batch's `pixels` array is recycled a few batches later, so consume
+        it before asking for more batches than `prefetch` ahead.
+        """
+        ready = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(sources, ready, stop), daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = ready.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            producer.join()
+
+    def _put(self, ready, stop, item):
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, sources, ready, stop):
+        size = self.preprocessor.output_size
+        # One buffer per queued batch, plus the one being filled and the one the consumer holds
+        buffers = [np.empty((self.batch_size, 3, size, size), dtype=np.float32) for _ in range(self.prefetch + 2)]
+        buffer_number = 0
+        max_in_flight = self.batch_size * (self.prefetch + 1)
+        reducing_gap = self.preprocessor.resizer.reducing_gap
+
+        executor = self._executor()
+        try:
+            pending = deque()
+            inputs = enumerate(sources)
+            exhausted = False
+            indices, failures = [], []
+            while not stop.is_set():
+                while not exhausted and len(pending) < max_in_flight:
+                    try:
+                        index, source = next(inputs)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    future = executor.submit(load_resized, source, size, self.min_size, reducing_gap)
+                    pending.append((index, future))
+                if not pending:
+                    break
+
+                index, future = pending.popleft()
+                try:
+                    pixels = future.result()
+                except Exception as e:
+                    failures.append((index, f"{type(e).__name__}: {e}"))
+                    continue
+
+                buffer = buffers[buffer_number % len(buffers)]
+                self.preprocessor.write(pixels, buffer[len(indices)])
+                indices.append(index)
+                if len(indices) == self.batch_size:
+                    if not self._put(ready, stop, PrefetchBatch(indices, buffer, failures)):
+                        return
+                    buffer_number += 1
+                    indices, failures = [], []
+
+            if indices or failures:
+                buffer = buffers[buffer_number % len(buffers)]
+                if not self._put(ready, stop, PrefetchBatch(indices, buffer[:len(indices)], failures)):
+                    return
+            self._put(ready, stop, _DONE)
+        except BaseException as e:
+            self._put(ready, stop, e)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
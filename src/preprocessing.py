@@ -0,0 +1,150 @@
+import io
+import math
+import threading
+
+import numpy as np
+from PIL import Image, ImageOps
+
+IMAGE_SIZE = 224
+CLIP_MEAN = [0.48145466, 0.4578275, 0.40821073]
+CLIP_STD = [0.26862954, 0.26130258, 0.27577711]
+
+# A custom transform to resize and pad images to a square
+class ResizeAndPad:
+    def __init__(self, output_size, fill_color=(0, 0, 0), reducing_gap=2.0):
+        self.output_size = output_size
+        self.fill_color = fill_color
+        # Shrink by an integer factor first when the source is more than `reducing_gap`
+        # times the target, then finish with LANCZOS (same default as Image.thumbnail)
+        self.reducing_gap = reducing_gap
+
+    def resized_size(self, size):
+        """Size with the longest side at most `output_size`, rounded like Image.thumbnail."""
+        width, height = size
+        x = y = self.output_size
+        if x >= width and y >= height:
+            return size
+        aspect = width / height
+        if x / y >= aspect:
+            x = max(min(math.floor(y * aspect), math.ceil(y * aspect), key=lambda n: abs(aspect - n / y)), 1)
+        else:
+            y = max(min(math.floor(x / aspect), math.ceil(x / aspect),
+                        key=lambda n: 0 if n == 0 else abs(aspect - x / n)), 1)
+        return x, y
+
+    def resize(self, img):
+        """Return `img` shrunk so that its longest side is `output_size`, unpadded."""
+        # resize() returns a new image, so the caller's image is left untouched
+        # without copying it first
+        size = self.resized_size(img.size)
+        if size != img.size:
+            img = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=self.reducing_gap)
+        return img
+
+    def __call__(self, img):
+        # Resize the image so that its longest side is `output_size`
+        img = self.resize(img)
+        
+        # Create a new square image with a black background
+        new_img = Image.new("RGB", (self.output_size, self.output_size), self.fill_color)
+        
+        # Paste the resized image into the center of the black square
+        paste_position = (
+            (self.output_size - img.width) // 2,
+            (self.output_size - img.height) // 2
+        )
+        new_img.paste(img, paste_position)
+        
+        return new_img
+
+
+def open_image(source, min_size=None):
+    """Open a path, file object or bytes as an upright RGB image.
+
+    With `min_size`, JPEGs are decoded with DCT scaling at the smallest 1/2, 1/4
+    or 1/8 scale that keeps both sides at least `min_size`, so a 50 MP upload
+    never has its full-resolution pixels decoded.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    img = Image.open(source)
+    if min_size is not None:
+        # No-op for formats without reduced decoding; must run before anything loads the pixels
+        img.draft("RGB", (min_size, min_size))
+    img = ImageOps.exif_transpose(img)
+    return img.convert("RGB")
+
+
+class FusedPreprocessor:
+    """ResizeAndPad + ToTensor + Normalize in one step.
+
+    The resized uint8 pixels are mapped through a per-channel lookup table
+    straight into a float32 (N, 3, size, size) buffer, and only the padding
+    border is filled with the normalized fill color. No padded PIL image or
+    intermediate float tensors are allocated.
+    """
+
+    def __init__(self, output_size=IMAGE_SIZE, mean=CLIP_MEAN, std=CLIP_STD, fill_color=(0, 0, 0), reducing_gap=2.0):
+        self.output_size = output_size
+        self.resizer = ResizeAndPad(output_size, fill_color, reducing_gap)
+        # Same float32 arithmetic as ToTensor (v / 255) followed by Normalize ((x - mean) / std)
+        values = np.arange(256, dtype=np.float32) / np.float32(255)
+        mean = np.asarray(mean, dtype=np.float32)[:, None]
+        std = np.asarray(std, dtype=np.float32)[:, None]
+        self.lut = (values[None, :] - mean) / std
+        self.fill = np.array([self.lut[c, fill_color[c]] for c in range(3)], dtype=np.float32)
+        # Batch buffers are reused between calls, one per thread
+        self._local = threading.local()
+
+    def resize_array(self, img):
+        """Resize a PIL image to fit `output_size` and return its uint8 (H, W, 3) pixels, unpadded."""
+        img = self.resizer.resize(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        return np.asarray(img)
+
+    def write(self, pixels, out):
+        """Normalize uint8 (H, W, 3) pixels into the center of `out`, a (3, size, size) float32 array."""
+        size = self.output_size
+        height, width = pixels.shape[:2]
+        top = (size - height) // 2
+        left = (size - width) // 2
+        bottom = top + height
+        right = left + width
+        for c in range(3):
+            plane = out[c]
+            fill = self.fill[c]
+            if top:
+                plane[:top] = fill
+            if bottom < size:
+                plane[bottom:] = fill
+            if left:
+                plane[top:bottom, :left] = fill
+            if right < size:
+                plane[top:bottom, right:] = fill
+            np.take(self.lut[c], pixels[:, :, c], out=plane[top:bottom, left:right], mode="clip")
+        return out
+
+    def __call__(self, img):
+        """Preprocess one PIL image into a new (3, size, size) float32 array."""
+        out = np.empty((3, self.output_size, self.output_size), dtype=np.float32)
+        return self.write(self.resize_array(img), out)
+
+    def batch_buffer(self, n):
+        """A reusable (n, 3, size, size) float32 buffer, private to the calling thread."""
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or len(buffer) < n:
+            buffer = np.empty((n, 3, self.output_size, self.output_size), dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer[:n]
+
+    def batch(self, images):
+        """Preprocess PIL images into this thread's reusable batch buffer.
+
+        The returned array is overwritten by the next call from the same thread,
+        so it must be consumed (or copied) before then.
+        """
+        out = self.batch_buffer(len(images))
+        for i, img in enumerate(images):
+            self.write(self.resize_array(img), out[i])
+        return out
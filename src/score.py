@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Score a directory, glob or JSONL manifest of images with batched inference.
+
+Results are written to OUTPUT/part-NNNNN.csv (or .parquet), one part per
+--chunk-size inputs, and progress is checkpointed after every part, so an
+interrupted run picks up where it stopped when started again with the same
+arguments:
+
+    python src/score.py photos/ --output scores/
+    python src/score.py "photos/**/*.jpg" --output scores/ --format parquet
+    python src/score.py manifest.jsonl --output scores/ --batch-size 64 --workers 8
+
+With --shard i/N, a worker scores only the inputs whose image id hashes to
+shard i, into its own shard-I-of-N-part-NNNNN files and checkpoint, so N
+workers (on one machine or several sharing OUTPUT) split a run without
+coordinating. merge_scores.py combines the shards afterwards:
+
+    python src/score.py photos/ --output scores/ --shard 0/4 &
+    ...
+    python src/score.py photos/ --output scores/ --shard 3/4 &
+    python src/merge_scores.py scores/ --output scores.csv --input photos/
+"""
+
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import hashlib
+import argparse
+from itertools import islice
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+CHECKPOINT_FILE = "_checkpoint.json"
+COLUMNS = ["image_id", "path", "score", "error"]
+
+
+def iter_inputs(source):
+    """Yield (image_id, path) pairs in a deterministic order.
+
+    `source` is a directory (walked recursively), a glob pattern, or a .jsonl
+    manifest whose lines have a "path" and optionally an "id". Relative
+    manifest paths are resolved against the manifest's directory.
+    """
+    if source.endswith(".jsonl"):
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                path = entry["path"]
+                if not os.path.isabs(path):
+                    path = os.path.join(base, path)
+                yield str(entry.get("id", entry["path"])), path
+    elif os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, source), path
+    else:
+        for path in sorted(glob.iglob(source, recursive=True)):
+            if os.path.isfile(path):
+                yield path, path
+
+
+def parse_shard(text):
+    """Parse "i/N" into (i, N)."""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {text!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in [0, {count}), got {text!r}")
+    return index, count
+
+
+def shard_of(image_id, num_shards):
+    """Stable shard for an image id: the same on every process, machine and Python version."""
+    digest = hashlib.sha1(image_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
+def shard_name(shard):
+    index, count = shard
+    return f"shard-{index:03d}-of-{count:03d}"
+
+
+def part_path(output_dir, chunk_number, fmt, prefix="part"):
+    return os.path.join(output_dir, f"{prefix}-{chunk_number:05d}.{fmt}")
+
+
+def write_part(rows, path, fmt):
+    """Write one chunk of result rows atomically."""
+    tmp_path = path + ".tmp"
+    if fmt == "parquet":
+        import pandas as pd
+
+        pd.DataFrame(rows, columns=COLUMNS).to_parquet(tmp_path, index=False)
+    else:
+        with open(tmp_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(checkpoint, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def score_chunk(predictor, items, args):
+    """Score one chunk of (image_id, path) pairs; returns result rows in input order."""
+    rows = [None] * len(items)
+    paths = [path for _, path in items]
+    for index, score, error in predictor.predict_stream(
+        paths, batch_size=args.batch_size, workers=args.workers, prefetch=args.prefetch,
+        use_processes=args.processes,
+    ):
+        image_id, path = items[index]
+        rows[index] = [image_id, path, score, error]
+    return rows
+
+
+def run(args, inputs, part_prefix="part", checkpoint_name=CHECKPOINT_FILE, extra_checkpoint=None):
+    """Score `inputs` in checkpointed chunks; returns the number of inputs scored in this run."""
+    os.makedirs(args.output, exist_ok=True)
+    checkpoint_path = os.path.join(args.output, checkpoint_name)
+    checkpoint = load_checkpoint(checkpoint_path)
+    settings = {"input": args.input, "format": args.format, "chunk_size": args.chunk_size}
+    settings.update(extra_checkpoint or {})
+
+    inputs = iter(inputs)
+    chunks_done = 0
+    if checkpoint is not None:
+        if checkpoint["settings"] != settings:
+            raise SystemExit(
+                f"❌ {checkpoint_path} was written with different settings {checkpoint['settings']}; "
+                "use a new --output directory or remove the checkpoint"
+            )
+        if checkpoint["done"]:
+            print(f"✅ Already complete: {checkpoint['items_done']} images in {args.output}")
+            return 0
+        chunks_done = checkpoint["chunks_done"]
+        # Skip the completed chunks and make sure the input still lines up with them
+        skipped = list(islice(inputs, checkpoint["items_done"]))
+        if len(skipped) != checkpoint["items_done"] or (skipped and skipped[-1][0] != checkpoint["last_id"]):
+            raise SystemExit("❌ The input no longer matches the checkpoint; refusing to resume")
+        print(f"⏩ Resuming after {checkpoint['items_done']} images ({chunks_done} parts)")
+    else:
+        checkpoint = {"settings": settings, "chunks_done": 0, "items_done": 0, "last_id": None, "done": False}
+
+    if args.threads:
+        # Before torch is imported, so OpenMP sizes its pool to the budget too
+        os.environ["OMP_NUM_THREADS"] = str(args.threads)
+        os.environ["MKL_NUM_THREADS"] = str(args.threads)
+    from laion_aesthetic_predictor import LAIONAestheticPredictor
+
+    if args.threads:
+        import torch
+
+        torch.set_num_threads(args.threads)
+    predictor = LAIONAestheticPredictor(device=args.device, precision=args.precision, bundle=args.bundle)
+
+    scored = 0
+    start = time.time()
+    while True:
+        items = list(islice(inputs, args.chunk_size))
+        if not items:
+            break
+        rows = score_chunk(predictor, items, args)
+        write_part(rows, part_path(args.output, chunks_done, args.format, part_prefix), args.format)
+
+        chunks_done += 1
+        scored += len(items)
+        checkpoint.update(chunks_done=chunks_done, items_done=checkpoint["items_done"] + len(items),
+                          last_id=items[-1][0])
+        save_checkpoint(checkpoint, checkpoint_path)
+        failed = sum(1 for row in rows if row[3] is not None)
+        rate = scored / max(time.time() - start, 1e-9)
+        print(f"Part {chunks_done - 1:05d}: {len(items)} images ({failed} failed), "
+              f"{checkpoint['items_done']} total, {rate:.1f} images/s", flush=True)
+
+    checkpoint["done"] = True
+    save_checkpoint(checkpoint, checkpoint_path)
+    print(f"✅ Scored {checkpoint['items_done']} images into {args.output}")
+    return scored
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Bulk aesthetic scoring with resumable checkpoints")
+    parser.add_argument("input", help="Directory, glob pattern (quote it) or .jsonl manifest")
+    parser.add_argument("--output", required=True, help="Directory for result parts and the checkpoint")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Inputs per output part / checkpoint")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None, help="Decode workers (default: CPU count)")
+    parser.add_argument("--prefetch", type=int, default=2, help="Batches decoded ahead of the model")
+    parser.add_argument("--processes", action="store_true", help="Decode in processes instead of threads")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--precision", choices=["fp32", "int8", "bf16"], default="fp32")
+    parser.add_argument("--bundle", default=None, help="Model bundle to load (see model_bundle.py)")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="Only score shard i of N (e.g. 0/4); each shard writes its own parts")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Torch threads for this worker (default with --shard: CPU count / N, at least 1). "
+                             "Set it explicitly when shards run on separate machines")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.chunk_size < 1:
+        raise SystemExit("❌ --chunk-size must be at least 1")
+    if args.shard is None:
+        run(args, iter_inputs(args.input))
+        return 0
+
+    index, count = args.shard
+    if args.threads is None:
+        args.threads = max(1, (os.cpu_count() or 1) // count)
+    if args.workers is None:
+        args.workers = args.threads
+    print(f"Shard {index}/{count}: {args.threads} torch threads, {args.workers} decode workers")
+    inputs = (item for item in iter_inputs(args.input) if shard_of(item[0], count) == index)
+    name = shard_name(args.shard)
+    run(args, inputs, part_prefix=f"{name}-part", checkpoint_name=f"_checkpoint-{name}.json",
+        extra_checkpoint={"shard": f"{index}/{count}"})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
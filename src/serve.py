@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Async HTTP scoring service around LAIONAestheticPredictor.
+
+Uploads are decoded and resized on a thread pool, and the backbone passes of
+concurrent requests are batched by the predictor's MicroBatcher, so the
+event loop only parses requests and awaits results:
+
+    python src/serve.py --port 8000
+
+    curl --data-binary @photo.jpg http://localhost:8000/score
+    curl -F image=@photo.jpg http://localhost:8000/score
+    curl -F a=@one.jpg -F b=@two.png http://localhost:8000/score/batch
+
+Responses are JSON with the score (0-10) and timings in milliseconds.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from PIL import Image
+
+from embedding_cache import EmbeddingCache, embedding_key
+from preprocessing import open_image
+
+
+class ScoringService:
+    """Routes uploads through the decode pool and the predictor's batching queue."""
+
+    def __init__(self, predictor, decode_workers=None, max_pending=256, head_check_seconds=5.0):
+        self.predictor = predictor
+        # How often to look for new fine-tuned head weights (0 disables it)
+        self.head_check_seconds = head_check_seconds
+        self.decode_pool = ThreadPoolExecutor(decode_workers or os.cpu_count() or 1, thread_name_prefix="decode")
+        # Backpressure: beyond this many images in flight, new requests get 503
+        self.max_pending = max_pending
+        self.pending = 0
+
+    def _decode(self, data):
+        pil_image = open_image(data, min_size=self.predictor.preprocess_config["draft_min_size"])
+        return self.predictor.fused_preprocess.resize_array(pil_image)
+
+    async def score(self, data):
+        """Score one encoded image; returns a result dict with timings in ms. Raises on undecodable data."""
+        start = time.perf_counter()
+        predictor = self.predictor
+        key = embedding_key(data, predictor.preprocess_config) if predictor.cache is not None else None
+        features = predictor.cache.get(key) if key is not None else None
+        decoded = start
+        if features is None:
+            pixels = await asyncio.get_running_loop().run_in_executor(self.decode_pool, self._decode, data)
+            decoded = time.perf_counter()
+            features = await asyncio.wrap_future(predictor.batcher.submit(pixels))
+            if key is not None:
+                predictor.cache.put(key, features)
+        score = float(predictor.score_embeddings(features[None, :])[0])
+        end = time.perf_counter()
+        return {
+            "score": score,
+            "cached": decoded == start,
+            "timing_ms": {
+                "decode": round((decoded - start) * 1000, 2),
+                "inference": round((end - decoded) * 1000, 2),
+                "total": round((end - start) * 1000, 2),
+            },
+        }
+
+    def _reserve(self, count):
+        if self.pending + count > self.max_pending:
+            raise web.HTTPServiceUnavailable(
+                text='{"error": "server busy, retry later"}', content_type="application/json"
+            )
+        self.pending += count
+
+    async def _read_uploads(self, request):
+        """Return [(name, bytes)] from a multipart form or a raw request body."""
+        if request.content_type.startswith("multipart/"):
+            uploads = []
+            reader = await request.multipart()
+            async for part in reader:
+                data = await part.read()
+                if data:
+                    uploads.append((part.filename or part.name, bytes(data)))
+            return uploads
+        data = await request.read()
+        return [("body", data)] if data else []
+
+    async def handle_score(self, request):
+        uploads = await self._read_uploads(request)
+        if len(uploads) != 1:
+            return web.json_response({"error": f"expected one image, got {len(uploads)}"}, status=400)
+        self._reserve(1)
+        try:
+            result = await self.score(uploads[0][1])
+        except Image.DecompressionBombError as e:
+            return web.json_response({"error": f"image too large: {e}"}, status=413)
+        except (OSError, ValueError) as e:
+            return web.json_response({"error": f"could not decode image: {e}"}, status=400)
+        finally:
+            self.pending -= 1
+        return web.json_response(result)
+
+    async def handle_batch(self, request):
+        start = time.perf_counter()
+        uploads = await self._read_uploads(request)
+        if not uploads:
+            return web.json_response({"error": "no images in request"}, status=400)
+        self._reserve(len(uploads))
+        try:
+            outcomes = await asyncio.gather(*(self.score(data) for _, data in uploads), return_exceptions=True)
+        finally:
+            self.pending -= len(uploads)
+
+        results = []
+        for (name, _), outcome in zip(uploads, outcomes):
+            if isinstance(outcome, Image.DecompressionBombError):
+                results.append({"name": name, "score": None, "error": f"image too large: {outcome}"})
+            elif isinstance(outcome, (OSError, ValueError)):
+                results.append({"name": name, "score": None, "error": f"could not decode image: {outcome}"})
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                results.append({"name": name, **outcome})
+        total = round((time.perf_counter() - start) * 1000, 2)
+        return web.json_response({"results": results, "timing_ms": {"total": total}})
+
+    async def handle_health(self, request):
+        config = self.predictor.preprocess_config
+        return web.json_response({
+            "status": "ok",
+            "model": config["model"],
+            "precision": config["precision"],
+            "head": self.predictor.head_version,
+            "pending": self.pending,
+        })
+
+    def app(self, max_upload_mb=20):
+        app = web.Application(client_max_size=int(max_upload_mb * 1024 * 1024))
+        app.add_routes([
+            web.get("/health", self.handle_health),
+            web.post("/score", self.handle_score),
+            web.post("/score/batch", self.handle_batch),
+        ])
+        if self.head_check_seconds > 0:
+            app.cleanup_ctx.append(self._watch_head)
+        app.on_cleanup.append(self._close)
+        return app
+
+    async def _watch_head(self, app):
+        """Swap in new fine-tuned head weights while the service keeps running."""
+
+        async def watch():
+            loop = asyncio.get_running_loop()
+            while True:
+                await asyncio.sleep(self.head_check_seconds)
+                try:
+                    await loop.run_in_executor(self.decode_pool, self.predictor.reload_head)
+                except Exception as e:
+                    # A half-copied or corrupt file: keep serving the current head and retry later
+                    print(f"Could not reload head weights: {e}")
+
+        task = asyncio.ensure_future(watch())
+        yield
+        task.cancel()
+
+    async def _close(self, app):
+        self.decode_pool.shutdown(wait=False)
+        self.predictor.batcher.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="HTTP aesthetic scoring service")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--precision", choices=["fp32", "int8", "bf16"],
+                        default=os.environ.get("AESTHETIC_PRECISION", "fp32"))
+    parser.add_argument("--bundle", default=None, help="Model bundle to load (see model_bundle.py)")
+    parser.add_argument("--max-batch-size", type=int, default=16, help="Images per backbone pass")
+    parser.add_argument("--max-wait-ms", type=float, default=5, help="How long a batch waits to fill up")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads for inference")
+    parser.add_argument("--decode-workers", type=int, default=None, help="Decode threads (default: CPU count)")
+    parser.add_argument("--max-pending", type=int, default=256, help="Images in flight before returning 503")
+    parser.add_argument("--max-upload-mb", type=float, default=20)
+    parser.add_argument("--cache-items", type=int, default=1024, help="Embedding cache size (0 disables it)")
+    parser.add_argument("--head-check-seconds", type=float, default=5.0,
+                        help="Interval for picking up new fine-tuned head weights (0 disables it)")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    from laion_aesthetic_predictor import LAIONAestheticPredictor
+
+    cache = EmbeddingCache(max_items=args.cache_items) if args.cache_items > 0 else None
+    predictor = LAIONAestheticPredictor(device=args.device, cache=cache, precision=args.precision, bundle=args.bundle)
+    predictor.enable_micro_batching(args.max_batch_size, args.max_wait_ms, args.threads)
+
+    service = ScoringService(predictor, args.decode_workers, args.max_pending, args.head_check_seconds)
+    web.run_app(service.app(args.max_upload_mb), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+from collections import namedtuple
+
+import torch
+
+# How patches that only cover letterbox padding are handled: kept as in the
+# full model, dropped before the first block, or averaged into a single token
+PADDING_MODES = ("keep", "drop", "merge")
+
+# `resolution` None means the backbone's native input size
+FastMode = namedtuple("FastMode", ["resolution", "padding"], defaults=(None, "merge"))
+
+
+def _border_width(is_fill):
+    """Per row of a (N, L) bool tensor, how many leading entries are True."""
+    return is_fill.to(torch.int32).cumprod(dim=1).sum(dim=1)
+
+
+def content_rects(pixels, fill):
+    """(N, 4) int tensor of (top, bottom, left, right) content bounds per image.
+
+    Padding is the run of rows and columns at each border whose pixels all
+    equal the normalized `fill` colour, which is exactly what FusedPreprocessor
+    writes around a letterboxed image. Content pixels of the fill colour on
+    the border are counted as padding too; they carry the same values.
+    """
+    fill = torch.as_tensor(fill, dtype=pixels.dtype, device=pixels.device)
+    is_fill = (pixels == fill[:, None, None]).all(dim=1)  # (N, H, W)
+    rows, cols = is_fill.all(dim=2), is_fill.all(dim=1)
+    height, width = is_fill.shape[1:]
+    top, left = _border_width(rows), _border_width(cols)
+    bottom = height - _border_width(rows.flip(1))
+    right = width - _border_width(cols.flip(1))
+    # An image that is all fill keeps every patch
+    blank = top >= height
+    top, bottom = torch.where(blank, 0, top), torch.where(blank, height, bottom)
+    left, right = torch.where(blank, 0, left), torch.where(blank, width, right)
+    return torch.stack([top, bottom, left, right], dim=1)
+
+
+class ReducedTokenViT:
+    """Runs a timm ViT on fewer tokens: at another resolution and/or without padding patches.
+
+    The position embeddings are resampled once to the `resolution` grid with
+    timm's resample_abs_pos_embed. Per batch, images are grouped by the
+    patches their content covers, and each group goes through the blocks with
+    only those tokens (plus, with padding="merge", one token averaging all
+    padding patches). Returns the same (N, dim) normed CLS features as
+    forward_features()[:, 0]; with the native resolution and padding="keep"
+    it computes exactly that.
+    """
+
+    def __init__(self, model, resolution=None, padding="merge"):
+        if padding not in PADDING_MODES:
+            raise ValueError(f"padding must be one of {PADDING_MODES}, got {padding!r}")
+        if getattr(model, "no_embed_class", False) or getattr(model, "reg_token", None) is not None:
+            raise ValueError("Reduced-token mode needs a ViT with a class position embedding and no register tokens")
+        self.model = model
+        self.patch = model.patch_embed.patch_size[0]
+        native = model.patch_embed.img_size[0]
+        self.resolution = resolution or native
+        if self.resolution % self.patch:
+            raise ValueError(f"resolution must be a multiple of the patch size {self.patch}, got {self.resolution}")
+        self.padding = padding
+        self.grid = self.resolution // self.patch
+        self.pos_embed = model.pos_embed
+        if self.resolution != native:
+            from timm.layers import resample_abs_pos_embed
+
+            with torch.no_grad():
+                self.pos_embed = resample_abs_pos_embed(
+                    model.pos_embed, new_size=(self.grid, self.grid), num_prefix_tokens=model.num_prefix_tokens,
+                )
+
+    def _tokens(self, pixels):
+        model = self.model
+        x = model.patch_embed.proj(pixels).flatten(2).transpose(1, 2)
+        x = model.patch_embed.norm(x)
+        x = torch.cat([model.cls_token.expand(len(x), -1, -1), x], dim=1) + self.pos_embed
+        x = model.pos_drop(x)
+        for name in ("patch_drop", "norm_pre"):  # Missing in older timm versions
+            layer = getattr(model, name, None)
+            if layer is not None:
+                x = layer(x)
+        return x
+
+    def patch_ranges(self, rects):
+        """Per image, the (first row, end row, first col, end col) patch grid range its content touches."""
+        p = self.patch
+        first = torch.div(rects[:, [0, 2]], p, rounding_mode="floor")
+        end = torch.div(rects[:, [1, 3]] + p - 1, p, rounding_mode="floor")
+        return torch.stack([first[:, 0], end[:, 0], first[:, 1], end[:, 1]], dim=1)
+
+    def token_counts(self, pixels, fill):
+        """Tokens (CLS included) each image of a batch goes through the blocks with."""
+        if self.padding == "keep":
+            return torch.full((len(pixels),), 1 + self.grid * self.grid)
+        ranges = self.patch_ranges(content_rects(pixels, fill))
+        counts = 1 + (ranges[:, 1] - ranges[:, 0]) * (ranges[:, 3] - ranges[:, 2])
+        if self.padding == "merge":
+            counts += (counts < 1 + self.grid * self.grid).to(counts.dtype)
+        return counts
+
+    def __call__(self, pixels, fill):
+        model = self.model
+        x = self._tokens(pixels)
+        if self.padding == "keep":
+            return model.norm(model.blocks(x))[:, 0]
+
+        features = x.new_empty((len(x), x.shape[-1]))
+        ranges = self.patch_ranges(content_rects(pixels, fill))
+        grid = torch.arange(self.grid * self.grid, device=x.device).view(self.grid, self.grid)
+        for key in torch.unique(ranges.cpu(), dim=0):
+            members = (ranges.cpu() == key).all(dim=1).nonzero().squeeze(1).to(x.device)
+            top, bottom, left, right = key.tolist()
+            inside = torch.zeros_like(grid, dtype=torch.bool)
+            inside[top:bottom, left:right] = True
+            keep = torch.cat([grid.new_zeros(1), 1 + grid[inside]])
+            group = x[members]
+            tokens = group[:, keep]
+            if self.padding == "merge" and not inside.all():
+                padding = group[:, 1 + grid[~inside]].mean(dim=1, keepdim=True)
+                tokens = torch.cat([tokens, padding], dim=1)
+            features[members] = model.norm(model.blocks(tokens))[:, 0].to(features.dtype)
+        return features
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Check the resumable, checksummed weight download against a local HTTP server
+"""
+
+import os
+import sys
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from laion_aesthetic_predictor import download_weights
+
+PAYLOAD = os.urandom(256 * 1024 + 123)
+PAYLOAD_SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+class WeightsServer:
+    """Serves PAYLOAD on a free local port and records the Range header of every request.
+
+    `ignore_range` answers every request with a full 200; `truncate_first`
+    drops the connection halfway through the first response; `delay` slows
+    each response down so concurrent callers overlap.
+    """
+
+    def __init__(self, ignore_range=False, truncate_first=False, delay=0.0):
+        self.ranges = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                requested = self.headers.get("Range")
+                server.ranges.append(requested)
+                start = 0
+                if requested and not ignore_range:
+                    start = int(requested.split("=")[1].rstrip("-"))
+                    if start >= len(PAYLOAD):
+                        self.send_response(416)
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+                else:
+                    self.send_response(200)
+                body = PAYLOAD[start:]
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                time.sleep(delay)
+                if truncate_first and len(server.ranges) == 1:
+                    self.wfile.write(body[:len(body) // 2])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/weights.pt"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_resumes_partial_file_with_range():
+    with tempfile.TemporaryDirectory() as tmp, WeightsServer() as server:
+        target = os.path.join(tmp, "weights.pt")
+        with open(target + ".part", "wb") as f:
+            f.write(PAYLOAD[:100000])
+        download_weights(server.url, target, sha256=PAYLOAD_SHA256)
+        assert read(target) == PAYLOAD
+        assert server.ranges == ["bytes=100000-"]
+        assert not os.path.exists(target + ".part")
+
+
+def test_resumes_after_dropped_connection():
+    with tempfile.TemporaryDirectory() as tmp, WeightsServer(truncate_first=True) as server:
+        target = os.path.join(tmp, "weights.pt")
+        # Small chunks, so the bytes received before the drop reach the partial file
+        download_weights(server.url, target, sha256=PAYLOAD_SHA256, chunk_size=16384)
+        assert read(target) == PAYLOAD
+        assert server.ranges[0] is None and server.ranges[1].startswith("bytes=")
+        assert len(server.ranges) == 2
+
+
+def test_server_ignoring_range_restarts_from_zero():
+    with tempfile.TemporaryDirectory() as tmp, WeightsServer(ignore_range=True) as server:
+        target = os.path.join(tmp, "weights.pt")
+        # Junk in the partial file must not end up in front of the full response
+        with open(target + ".part", "wb") as f:
+            f.write(b"x" * 5000)
+        download_weights(server.url, target, sha256=PAYLOAD_SHA256)
+        assert read(target) == PAYLOAD
+        assert server.ranges == ["bytes=5000-"]
+
+
+def test_checksum_mismatch_removes_partial_and_raises():
+    with tempfile.TemporaryDirectory() as tmp, WeightsServer() as server:
+        target = os.path.join(tmp, "weights.pt")
+        try:
+            download_weights(server.url, target, sha256="0" * 64)
+        except ValueError as e:
+            assert "Checksum mismatch" in str(e)
+        else:
+            raise AssertionError("download_weights accepted a payload with the wrong checksum")
+        assert not os.path.exists(target)
+        assert not os.path.exists(target + ".part")
+
+
+def test_concurrent_callers_download_once():
+    with tempfile.TemporaryDirectory() as tmp, WeightsServer(delay=0.3) as server:
+        target = os.path.join(tmp, "weights.pt")
+        errors = []
+
+        def worker():
+            try:
+                download_weights(server.url, target, sha256=PAYLOAD_SHA256)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors, errors
+        assert read(target) == PAYLOAD
+        # The second caller waited on the lock and found the finished file
+        assert len(server.ranges) == 1
+
+
+def main():
+    print("🧪 Checking download_weights against a local HTTP server...")
+    tests = [
+        test_resumes_partial_file_with_range,
+        test_resumes_after_dropped_connection,
+        test_server_ignoring_range_restarts_from_zero,
+        test_checksum_mismatch_removes_partial_and_raises,
+        test_concurrent_callers_download_once,
+    ]
+    ok = True
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ {test.__name__}: {e}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Check the early-exit report against scoring each image on its own
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import laion_aesthetic_predictor as lap
+from early_exit import EXIT_BLOCKS, EarlyExitScorer, ExitHead, evaluate, load_pixel_batches
+
+NUM_IMAGES = 11
+# 6 batches: more than PrefetchPipeline's prefetch + 2 recycled buffers
+BATCH_SIZE = 2
+
+
+def make_predictor():
+    """A LAIONAestheticPredictor around a randomly initialised ViT, without any download."""
+    import timm
+
+    torch.manual_seed(0)
+    predictor = object.__new__(lap.LAIONAestheticPredictor)
+    predictor.device = "cpu"
+    predictor.precision = "fp32"
+    predictor.cache = None
+    predictor.batcher = None
+    head = lap.AestheticMLP().eval()
+    with torch.no_grad():
+        head.layers[-1].bias.fill_(5.0)  # Keep scores away from the clamp at 0
+    predictor._head_state = lap.HeadState(head, "test", None)
+    predictor.model = timm.create_model(lap.MODEL_NAME, pretrained=False).eval()
+    predictor._native_size = lap.IMAGE_SIZE
+    predictor._normalization = (lap.CLIP_MEAN, lap.CLIP_STD)
+    predictor._set_fast_mode(None)
+    return predictor
+
+
+def make_images(directory):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(NUM_IMAGES):
+        width, height = [(320, 240), (240, 320), (300, 300)][i % 3]
+        pixels = (rng.random((height, width, 3)) * rng.uniform(0.2, 1.0) * 255).astype(np.uint8)
+        path = os.path.join(directory, f"{i:02d}.png")
+        Image.fromarray(pixels).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_report_matches_per_image_scoring():
+    predictor = make_predictor()
+    torch.manual_seed(1)
+    heads = {block: ExitHead().eval() for block in EXIT_BLOCKS}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_images(tmp)
+        batches = load_pixel_batches(predictor, paths, batch_size=BATCH_SIZE, workers=1)
+        images = [Image.open(path).convert("RGB") for path in paths]
+
+    assert sum(len(batch) for batch in batches) == NUM_IMAGES
+    # Every batch holds its own images, not a recycled buffer's latest contents
+    assert len({batch.sum().item() for batch in batches}) == len(batches)
+
+    # Thresholds at which nothing, part of the set, and everything exits early
+    with torch.no_grad():
+        stds = [head.predict(torch.randn(4, 768))[1] for head in heads.values()]
+    middle = float(torch.cat(stds).median())
+    thresholds = (0.0, middle, float("inf"))
+    report = evaluate(predictor, heads, batches, thresholds)
+
+    full = np.array([predictor.predict_batch([img])[0] for img in images])
+    for row, threshold in zip(report, thresholds):
+        scorer = EarlyExitScorer(predictor, heads, threshold)
+        results = [scorer.predict_batch([img]) for img in images]
+        scores = np.array([r[0][0] for r in results])
+        blocks = np.array([r[1][0] for r in results])
+        drift = np.abs(scores - full)
+        assert row["images"] == NUM_IMAGES
+        assert abs(row["avg_blocks"] - blocks.mean()) < 1e-9, (threshold, row["avg_blocks"], blocks.mean())
+        np.testing.assert_allclose(row["mean_abs_drift"], drift.mean(), atol=1e-4)
+        np.testing.assert_allclose(row["max_abs_drift"], drift.max(), atol=1e-4)
+    assert report[0]["avg_blocks"] == len(predictor.model.blocks) and report[0]["max_abs_drift"] == 0.0
+
+
+def main():
+    print("🧪 Checking the early-exit report against per-image scoring...")
+    try:
+        test_report_matches_per_image_scoring()
+        print("✅ test_report_matches_per_image_scoring")
+        return 0
+    except AssertionError as e:
+        print(f"❌ test_report_matches_per_image_scoring: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Check that cached embeddings never hold on to the caller's arrays
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from embedding_cache import EmbeddingCache
+
+
+def test_put_stores_an_owned_copy():
+    cache = EmbeddingCache(max_items=8)
+    batch = np.random.default_rng(0).random((4, 768)).astype(np.float32)
+    for i, row in enumerate(batch):
+        cache.put(f"key{i}", row)
+
+    for i in range(len(batch)):
+        stored = cache.get(f"key{i}")
+        assert stored.base is None, "cached embedding is a view into the batch"
+        np.testing.assert_array_equal(stored, batch[i])
+    # The caller's array stays writable and independent of the cache
+    batch[0] = 0
+    assert cache.get("key0").any()
+
+
+def main():
+    print("🧪 Checking the embedding cache...")
+    try:
+        test_put_stores_an_owned_copy()
+        print("✅ test_put_stores_an_owned_copy")
+        return 0
+    except AssertionError as e:
+        print(f"❌ test_put_stores_an_owned_copy: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Check FeatureStore round trips and the conversion of legacy feature DataFrames
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from feature_store import FEATURE_DIM, FeatureStore
+
+
+def vectors(n, seed=0):
+    return list(np.random.default_rng(seed).random((n, FEATURE_DIM), dtype=np.float32))
+
+
+def test_vector_column_wins_over_numeric_columns():
+    # The legacy features.pkl shape: id, a numeric label and one vector column
+    df = pd.DataFrame({"image_id": ["a", "b"], "score": [5.0, 7.0], "features": vectors(2)})
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FeatureStore.from_dataframe(df, os.path.join(tmp, "store"))
+        assert store.dim == FEATURE_DIM
+        np.testing.assert_array_equal(store.get(["b"])[0], df["features"][1])
+
+
+def test_one_column_per_dimension():
+    columns = {f"f{i}": np.arange(3, dtype=np.float32) + i for i in range(FEATURE_DIM)}
+    df = pd.DataFrame({"image_id": ["a", "b", "c"], **columns})
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FeatureStore.from_dataframe(df, os.path.join(tmp, "store"))
+        assert store.dim == FEATURE_DIM
+        assert store.get(["c"])[0][10] == 12
+
+
+def test_ambiguous_frames_raise():
+    ambiguous = [
+        pd.DataFrame({"image_id": ["a"], "score": [5.0]}),
+        pd.DataFrame({"image_id": ["a"], "name": ["x"]}),
+        pd.DataFrame({"image_id": ["a"], "clip": vectors(1), "vit": vectors(1, seed=1)}),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for df in ambiguous:
+            path = os.path.join(tmp, "store")
+            try:
+                FeatureStore.from_dataframe(df, path)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"converted columns {list(df.columns)} without complaint")
+            assert not os.path.exists(path)
+
+
+def test_failed_conversion_leaves_no_store():
+    # The duplicate id only fails in the second chunk, after the first was written
+    df = pd.DataFrame({"image_id": ["a", "b", "a"], "features": vectors(3)})
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "store")
+        try:
+            FeatureStore.from_dataframe(df, path, chunk_size=2)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("duplicate ids were accepted")
+        assert not os.path.exists(path)
+        # A later conversion of good data still works
+        store = FeatureStore.from_dataframe(df.iloc[:2], path)
+        assert len(FeatureStore(path)) == 2 == len(store)
+
+
+def test_ids_with_unicode_line_breaks_round_trip():
+    ids = ["a\x0cb", "c d", "e\x85f", "g"]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FeatureStore(os.path.join(tmp, "store"))
+        store.append(ids, np.stack(vectors(len(ids))))
+        reopened = FeatureStore(os.path.join(tmp, "store"))
+        assert reopened.image_ids == ids
+        np.testing.assert_array_equal(reopened.get(["g"]), store.get(["g"]))
+
+
+def main():
+    print("🧪 Checking FeatureStore...")
+    tests = [
+        test_vector_column_wins_over_numeric_columns,
+        test_one_column_per_dimension,
+        test_ambiguous_frames_raise,
+        test_failed_conversion_leaves_no_store,
+        test_ids_with_unicode_line_breaks_round_trip,
+    ]
+    ok = True
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ {test.__name__}: {e}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
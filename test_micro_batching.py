@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Check that every scoring entry point shares the backbone through the micro-batcher
+"""
+
+import io
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from test_early_exit import make_predictor
+
+
+def make_images(count=5):
+    rng = np.random.default_rng(0)
+    sizes = [(320, 240), (240, 320), (300, 300)]
+    return [Image.fromarray((rng.random(sizes[i % 3][::-1] + (3,)) * 255).astype(np.uint8)) for i in range(count)]
+
+
+def test_entry_points_use_the_batcher():
+    predictor = make_predictor()
+    images = make_images()
+    blobs = []
+    for image in images:
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        blobs.append(buffer.getvalue())
+    expected_batch = predictor.predict_batch(images, batch_size=2)
+    expected_bytes = [predictor.predict_bytes(data) for data in blobs]
+
+    threads = []
+    embed_tensor = predictor._embed_tensor
+
+    def recording_embed_tensor(batch):
+        threads.append(threading.current_thread().name)
+        return embed_tensor(batch)
+
+    predictor._embed_tensor = recording_embed_tensor
+    predictor.enable_micro_batching(max_batch_size=4, max_wait_ms=50)
+    try:
+        scores = predictor.predict_batch(images, batch_size=2)
+        byte_scores = [predictor.predict_bytes(data) for data in blobs]
+        single = predictor.predict(images[0])
+    finally:
+        predictor.batcher.close()
+
+    assert threads, "the backbone never ran"
+    assert set(threads) == {"micro-batcher"}, f"backbone ran on {set(threads)}"
+    np.testing.assert_allclose(scores, expected_batch, atol=1e-4)
+    np.testing.assert_allclose(byte_scores, expected_bytes, atol=1e-4)
+    np.testing.assert_allclose(single, expected_batch[0], atol=1e-4)
+
+
+def main():
+    print("🧪 Checking that scoring goes through the micro-batcher...")
+    try:
+        test_entry_points_use_the_batcher()
+        print("✅ test_entry_points_use_the_batcher")
+        return 0
+    except AssertionError as e:
+        print(f"❌ test_entry_points_use_the_batcher: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Check that FusedPreprocessor matches the torchvision pipeline it replaces
+(ResizeAndPad + ToTensor + Normalize), for single images and batches
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from preprocessing import CLIP_MEAN, CLIP_STD, IMAGE_SIZE, FusedPreprocessor, ResizeAndPad
+
+# (mode, width, height): landscape, portrait, square, extreme and odd aspect
+# ratios, and images already smaller than the output size
+CASES = [
+    ("RGB", 640, 480),
+    ("RGB", 333, 1001),
+    ("RGB", 224, 224),
+    ("RGB", 1500, 37),
+    ("RGB", 101, 57),
+    ("L", 517, 389),
+    ("L", 120, 300),
+    ("RGBA", 801, 603),
+    ("RGBA", 45, 230),
+]
+
+
+def make_image(mode, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    channels = {"RGB": 3, "L": 1, "RGBA": 4}[mode]
+    pixels = rng.integers(0, 256, size=(height, width, channels), dtype=np.uint8)
+    return Image.fromarray(pixels[:, :, 0] if channels == 1 else pixels, mode)
+
+
+def reference_pipeline(size=IMAGE_SIZE):
+    from torchvision import transforms
+
+    return transforms.Compose([
+        ResizeAndPad(size),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=CLIP_MEAN, std=CLIP_STD),
+    ])
+
+
+def test_single_image_matches_torchvision():
+    reference = reference_pipeline()
+    fused = FusedPreprocessor(IMAGE_SIZE, CLIP_MEAN, CLIP_STD)
+    for i, (mode, width, height) in enumerate(CASES):
+        img = make_image(mode, width, height, seed=i)
+        expected = reference(img).numpy()
+        actual = fused(img)
+        assert actual.shape == expected.shape, (mode, width, height)
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-6, err_msg=f"{mode} {width}x{height}")
+
+
+def test_batch_matches_torchvision():
+    reference = reference_pipeline()
+    fused = FusedPreprocessor(IMAGE_SIZE, CLIP_MEAN, CLIP_STD)
+    images = [make_image(mode, width, height, seed=i) for i, (mode, width, height) in enumerate(CASES)]
+    expected = np.stack([reference(img).numpy() for img in images])
+    np.testing.assert_allclose(fused.batch(images), expected, rtol=0, atol=1e-6)
+
+    # The batch buffer is reused: a smaller second batch must not keep stale padding
+    np.testing.assert_allclose(fused.batch(images[::-1][:3]), expected[::-1][:3], rtol=0, atol=1e-6)
+
+
+def main():
+    print("🧪 Checking FusedPreprocessor against the torchvision pipeline...")
+    ok = True
+    for test in (test_single_image_matches_torchvision, test_batch_matches_torchvision):
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            ok = False
+            print(f"❌ {test.__name__}: {e}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())